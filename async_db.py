@@ -0,0 +1,109 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database
+
+READER_THREADS = 4
+# Calls allowed in flight (queued or running); further callers wait their turn
+MAX_PENDING = 64
+
+
+class AsyncDatabase:
+    # asyncio facade over a Database (or any Storage engine) for services that
+    # run an event loop next to the Tk apps. Every write goes through one
+    # writer thread, in submission order, so coroutines never contend for
+    # SQLite's write lock; reads run on a small pool of their own and proceed
+    # concurrently with it (WAL readers don't block the writer). Each thread
+    # keeps its own connection through Database's per-thread pool.
+    def __init__(self, db, readers=READER_THREADS, max_pending=MAX_PENDING, owns_db=False):
+        self.db = db
+        self._owns_db = owns_db
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-async-writer")
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-async-reader")
+        self.max_pending = max_pending
+        # Created on first use so it belongs to the loop actually running the calls
+        self._slots = None
+
+    @classmethod
+    def open(cls, db_name="records.db", **kwargs):
+        # A private Database for this facade, closed by close()
+        return cls(Database(db_name), owns_db=True, **kwargs)
+
+    async def _call(self, executor, func, *args, **kwargs):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    async def _read(self, func, *args, **kwargs):
+        return await self._call(self._readers, func, *args, **kwargs)
+
+    async def _write(self, func, *args, **kwargs):
+        return await self._call(self._writer, func, *args, **kwargs)
+
+    async def add_record(self, name, age, address, contact, email):
+        return await self._write(self.db.add_record, name, age, address, contact, email)
+
+    async def add_records(self, rows, batch_size=500):
+        return await self._write(self.db.add_records, list(rows), batch_size)
+
+    async def update_record(self, record_id, name, age, address, contact, email, expected_version=None):
+        return await self._write(self.db.update_record, record_id, name, age, address, contact, email,
+                                 expected_version)
+
+    async def update_records(self, changes):
+        return await self._write(self.db.update_records, changes)
+
+    async def delete_record(self, record_id, expected_version=None):
+        return await self._write(self.db.delete_record, record_id, expected_version)
+
+    async def delete_records(self, ids):
+        return await self._write(self.db.delete_records, list(ids))
+
+    async def get_records(self, columns=None):
+        return await self._read(self.db.get_records, columns)
+
+    async def get_record_by_id(self, record_id):
+        return await self._read(self.db.get_record_by_id, record_id)
+
+    async def get_records_page(self, after_id=None, limit=50, order_by="id", columns=None, filters=None):
+        return await self._read(self.db.get_records_page, after_id, limit, order_by, columns, filters)
+
+    async def count_records(self, filters=None):
+        return await self._read(self.db.count_records, filters)
+
+    async def search(self, query, limit=50):
+        return await self._read(self.db.search, query, limit)
+
+    async def verify_not_exists(self, name, email, exclude_id=None):
+        return await self._read(self.db.verify_not_exists, name, email, exclude_id)
+
+    async def iter_records(self, batch_size=500, columns=None):
+        # Streams the table in id order, one keyset page per reader call, so no
+        # cursor is held open across awaits (or across pool threads)
+        after_id = None
+        while True:
+            page = await self._read(self.db.get_records_page, after_id, batch_size, "id", columns)
+            for record in page:
+                yield record
+            if len(page) < batch_size:
+                break
+            after_id = page[-1].id
+
+    async def close(self):
+        # Lets queued calls finish, then closes the Database if open() made it
+        await asyncio.get_running_loop().run_in_executor(None, self._shutdown)
+
+    def _shutdown(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        if self._owns_db:
+            self.db.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
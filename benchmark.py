@@ -0,0 +1,280 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+
+from database import Database
+from memory_storage import MemoryStorage
+
+DEFAULT_SIZES = (1000, 10000)
+# Individual calls timed per operation; whole-table reads are timed fewer times
+SAMPLES = 200
+FULL_SCAN_SAMPLES = 5
+
+
+def make_row(i):
+    return (f"Student {i}", 18 + i % 10, f"{i} Campus Rd", f"0917{i:07d}"[:11], f"student{i}@example.com")
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "samples": len(timings),
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p95_ms": timings[min(int(len(timings) * 0.95), len(timings) - 1)] * 1000,
+        "ops_per_sec": len(timings) / sum(timings) if sum(timings) else None,
+    }
+
+
+def time_calls(func, args_list):
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def build_dataset(path, size, engine="sqlite", cache_size=0):
+    # The record/query cache is off by default so repeated samples time the
+    # queries themselves and stay comparable with runs from before it existed
+    db = MemoryStorage(path) if engine == "memory" else Database(path, cache_size=cache_size)
+    start = time.perf_counter()
+    db.add_records((make_row(i) for i in range(size)), batch_size=5000)
+    elapsed = time.perf_counter() - start
+    return db, {"samples": 1, "mean_ms": elapsed * 1000, "rows_per_sec": size / elapsed}
+
+
+def bench_database(db, size, rng):
+    results = {}
+    ids = [rng.randint(1, size) for _ in range(SAMPLES)]
+    results["get_record_by_id"] = time_calls(db.get_record_by_id, [(rid,) for rid in ids])
+    results["verify_not_exists"] = time_calls(
+        db.verify_not_exists, [(f"Student {rid}", f"nobody{rid}@example.com") for rid in ids])
+    results["get_records"] = time_calls(db.get_records, [()] * FULL_SCAN_SAMPLES)
+    results["iter_records"] = time_calls(lambda: sum(1 for _ in db.iter_records()), [()] * FULL_SCAN_SAMPLES)
+    results["count_records"] = time_calls(db.count_records, [()] * SAMPLES)
+    results["get_records_page"] = time_calls(
+        db.get_records_page, [(rid, 50, "id") for rid in ids])
+    results["get_records_page_by_name"] = time_calls(
+        db.get_records_page, [(rid, 50, "name") for rid in ids])
+    results["search"] = time_calls(db.search, [(f"stud {rid}", 50) for rid in ids])
+    results["update_record"] = time_calls(
+        db.update_record,
+        [(rid, *make_row(rid - 1)[:2], "Updated", "09170000000", make_row(rid - 1)[4]) for rid in ids])
+    new_rows = [make_row(size + i) for i in range(SAMPLES)]
+    results["add_record"] = time_calls(db.add_record, new_rows)
+    results["delete_record"] = time_calls(db.delete_record, [(size + i + 1,) for i in range(SAMPLES)])
+    # The same number of rows again, but as one batch per call
+    inserted, _ = db.add_records(make_row(size + SAMPLES + i) for i in range(SAMPLES))
+    new_ids = list(range(size + SAMPLES + 1, size + SAMPLES + inserted + 1))
+    results["update_records"] = time_calls(
+        db.update_records, [({rid: {"address": "Batch"} for rid in new_ids},)])
+    results["delete_records"] = time_calls(db.delete_records, [(new_ids,)])
+    return results
+
+
+def bench_maintenance(db, tmp):
+    # One run each: these scale with the file size rather than per call
+    return {
+        "backup": time_calls(db.backup, [(os.path.join(tmp, "backup.db"),)]),
+        "vacuum": time_calls(db.vacuum, [()]),
+        "analyze": time_calls(db.analyze, [()]),
+    }
+
+
+def start_virtual_display():
+    # Returns the Xvfb process (or None) so Tk can run without a real screen
+    if os.environ.get("DISPLAY"):
+        return None
+    if not shutil.which("Xvfb"):
+        return None
+    display = ":97"
+    proc = subprocess.Popen(["Xvfb", display, "-screen", "0", "1024x768x24"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1)
+    os.environ["DISPLAY"] = display
+    return proc
+
+
+def pump_until(app, done, timeout=120):
+    deadline = time.perf_counter() + timeout
+    while not done():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("GUI did not finish loading")
+        app.update()
+
+
+def bench_gui(path, size):
+    import main
+    import main_tk
+
+    results = {}
+    # The card list only builds cards for a mapped, sized canvas, so this window
+    # stays mapped (on the virtual display); the Treeview app runs withdrawn.
+    app = main.RecordSystemApp(db_name=path)
+    try:
+        pump_until(app, lambda: "interactive" in app.startup_times and "first_paint" in app.startup_times)
+        for stage, elapsed in app.startup_times.items():
+            results[f"RecordSystemApp.startup.{stage}"] = summarize([elapsed])
+        screen = app.get_frame("ViewRecordsScreen")
+        pump_until(app, lambda: screen.visible)
+        timings = []
+        for _ in range(FULL_SCAN_SAMPLES):
+            start = time.perf_counter()
+            screen.load_records()
+            pump_until(app, lambda: not screen.count_pending and screen.visible and not screen.loading_pages)
+            timings.append(time.perf_counter() - start)
+        results["ViewRecordsScreen.load_records"] = summarize(timings)
+    finally:
+        app.on_close()
+
+    app = main_tk.RecordSystemApp(db_name=path)
+    try:
+        pump_until(app, lambda: "interactive" in app.startup_times and "first_paint" in app.startup_times)
+        for stage, elapsed in app.startup_times.items():
+            results[f"main_tk.RecordSystemApp.startup.{stage}"] = summarize([elapsed])
+        app.withdraw()
+        frame = app.get_frame("ViewRecordsFrame")
+        timings = []
+        for _ in range(FULL_SCAN_SAMPLES):
+            start = time.perf_counter()
+            frame.load_records()
+            # Rows load lazily; time until the first chunk is on screen
+            pump_until(app, lambda: not frame.loading_chunk and frame.tree.get_children())
+            timings.append(time.perf_counter() - start)
+        results["ViewRecordsFrame.load_records"] = summarize(timings)
+        timings = []
+        for _ in range(FULL_SCAN_SAMPLES):
+            start = time.perf_counter()
+            frame.sort_by("name")
+            pump_until(app, lambda: not frame.loading_chunk and frame.tree.get_children())
+            timings.append(time.perf_counter() - start)
+        results["ViewRecordsFrame.sort_by"] = summarize(timings)
+    finally:
+        app.on_close()
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nComparison with {baseline_path} (mean ms, negative is faster):")
+    for size, ops in results["sizes"].items():
+        old_ops = baseline.get("sizes", {}).get(size, {})
+        for name, stats in ops.items():
+            old = old_ops.get(name)
+            if not old:
+                continue
+            change = (stats["mean_ms"] - old["mean_ms"]) / old["mean_ms"] * 100 if old["mean_ms"] else 0.0
+            print(f"  {size:>8} {name:<36} {old['mean_ms']:10.3f} -> {stats['mean_ms']:10.3f}  {change:+7.1f}%")
+
+
+def bench_connections(count):
+    # Before/after for the shared connection: the original connect-per-call
+    # pattern (a bare sqlite3.connect around each statement) vs one instance
+    def connect_per_call(path, sql, params=()):
+        conn = sqlite3.connect(path)
+        try:
+            result = conn.execute(sql, params).fetchone()
+            conn.commit()
+            return result
+        finally:
+            conn.close()
+
+    def run(add, get, count_all):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            # Schema created up front, outside the timing
+            Database(path).close()
+            start = time.perf_counter()
+            for i in range(count):
+                add(path, i)
+                get(path, i + 1)
+                count_all(path)
+            elapsed = time.perf_counter() - start
+            Database.shared(path).close()
+        return count * 3 / elapsed
+
+    before = run(lambda path, i: connect_per_call(
+                     path, "INSERT INTO records (name, age, address, contact, email) VALUES (?, ?, ?, ?, ?)",
+                     make_row(i)),
+                 lambda path, record_id: connect_per_call(path, "SELECT * FROM records WHERE id=?", (record_id,)),
+                 lambda path: connect_per_call(path, "SELECT COUNT(*) FROM records"))
+    after = run(lambda path, i: Database.shared(path).add_record(*make_row(i)),
+                lambda path, record_id: Database.shared(path).get_record_by_id(record_id),
+                lambda path: Database.shared(path).count_records())
+    return {"connect_per_call_ops_per_sec": before, "shared_ops_per_sec": after, "speedup": after / before}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Database layer and list rendering")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated dataset sizes, e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--gui", action="store_true", help="also time the Tk list views (uses Xvfb if no DISPLAY)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON file from an earlier run")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--engine", choices=("sqlite", "memory"), default="sqlite",
+                        help="storage engine to time (memory runs without disk I/O)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "engine": args.engine,
+        },
+        "connections": bench_connections(300),
+        "sizes": {},
+    }
+    print(f"connect-per-call vs shared: {results['connections']['speedup']:.1f}x")
+
+    display = start_virtual_display() if args.gui else None
+    try:
+        for size in sizes:
+            rng = random.Random(args.seed)
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, f"bench_{size}.db")
+                db, load = build_dataset(path, size, args.engine)
+                ops = {"add_records": load}
+                ops.update(bench_database(db, size, rng))
+                if args.engine == "sqlite":
+                    ops.update(bench_maintenance(db, tmp))
+                db.close()
+                if args.gui:
+                    if args.engine != "sqlite":
+                        print("Skipping GUI timings: the apps read the SQLite file")
+                    elif os.environ.get("DISPLAY"):
+                        ops.update(bench_gui(path, size))
+                    else:
+                        print("Skipping GUI timings: no DISPLAY and Xvfb not found")
+            results["sizes"][str(size)] = ops
+            print(f"\n{size} records")
+            for name, stats in ops.items():
+                print(f"  {name:<36} mean {stats['mean_ms']:10.3f} ms  ({stats['samples']} samples)")
+    finally:
+        if display:
+            display.terminate()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
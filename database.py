@@ -1,69 +1,1221 @@
-
+import csv
+import functools
+import json
+import os
 import sqlite3
+import threading
+import time
+
+from instrumentation import InstrumentedConnection
+from memory_storage import MemoryStorage, WriteBehindStorage
+from migrations import (AGE_LABELS, BACKFILL_BATCH_SIZE, EMAIL_DOMAIN_SQL, age_bracket_sql, duplicate_values,
+                        non_unique_fields, pending_backfills)
+from migrations import migrate as run_migrations
+from migrations import run_backfills as run_pending_backfills
+from record import Record, record_factory
+from record_cache import RecordCache
+from storage import (COLUMNS, INSTRUMENT_FILE, RECORD_COLUMNS, SEARCH_TOKEN_RE, ConflictError, DuplicateRecordError,
+                     Storage, instrumented, projected_columns)
+from validation import FIELDS, validate_rows
+
+# Keeps "IN (...)" lists well below SQLite's bound-parameter limit
+MAX_IN_PARAMS = 400
+SELECT_COLUMNS = ", ".join(RECORD_COLUMNS)
+# Emails sort case-insensitively, the way their (unique) index is built, so
+# that index serves ORDER BY email. In keyset comparisons the collation goes
+# on the right-hand side: SQLite only turns them into an index range then.
+SORT_COLLATIONS = {"email": " COLLATE NOCASE"}
+
+# Connection tuning applied on every connect. "multi_user" suits several desks
+# sharing one local records.db; "safe" keeps SQLite's rollback journal, which
+# is the only mode that works on network shares.
+PROFILES = {
+    "multi_user": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout_ms": 5000,
+        "cache_size_kb": 16384,
+        "mmap_size": 64 * 1024 * 1024,
+        "lock_retries": 5,
+        "retry_backoff_s": 0.05,
+        "checkpoint_interval_s": 60,
+    },
+    "safe": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout_ms": 10000,
+        "cache_size_kb": 2048,
+        "mmap_size": 0,
+        "lock_retries": 5,
+        "retry_backoff_s": 0.1,
+        "checkpoint_interval_s": 0,
+    },
+}
+DEFAULT_PROFILE = os.environ.get("RMS_DB_PROFILE", "multi_user")
+# Records kept in the in-process cache; RMS_DB_CACHE=0 turns caching off
+DEFAULT_CACHE_SIZE = int(os.environ.get("RMS_DB_CACHE", "1024"))
+# Engine behind Database.shared: "sqlite" (the file), "memory" (nothing is
+# saved) or "write_behind" (reads from memory, writes saved in the background)
+DEFAULT_ENGINE = os.environ.get("RMS_DB_ENGINE", "sqlite")
+ENGINES = ("sqlite", "memory", "write_behind")
+# Pages copied per backup step and freed per incremental-vacuum step; other
+# connections get the lock in between
+BACKUP_PAGES = 1024
+VACUUM_PAGES = 1024
+
+def retry_if_locked(method):
+    # Busy timeouts cover most waits, but a WAL reader upgrading to a writer can
+    # still get SQLITE_BUSY immediately; back off and retry a few times.
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        retries = self.profile["lock_retries"]
+        for attempt in range(retries + 1):
+            try:
+                return method(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if attempt == retries or ("locked" not in str(e) and "busy" not in str(e)):
+                    raise
+                time.sleep(self.profile["retry_backoff_s"] * 2 ** attempt)
+    return wrapper
+
+def _freeze(value):
+    # Hashable form of call arguments for cache keys
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
 
-class Database:
-    def __init__(self, db_name="records.db"):
-        self.db_name = db_name
-        self.create_table()
+def cached_query(method):
+    # Serves repeated list/page/count reads from the query cache until a write
+    # (or another connection's commit) invalidates it
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.cache is None:
+            return method(self, *args, **kwargs)
+        self._check_external_changes()
+        key = (method.__name__, _freeze(args), _freeze(kwargs))
+        found, value = self.cache.get_query(key)
+        if not found:
+            generation = self.cache.generation
+            value = method(self, *args, **kwargs)
+            self.cache.put_query(key, value, generation)
+        # Callers get their own list so they can't corrupt the cached one
+        return list(value) if isinstance(value, list) else value
+    return wrapper
+
+class Database(Storage):
+    # The SQLite engine: records.db on disk, shared by every desk
+    def __init__(self, db_name="records.db", profile=None, cache_size=None, instrument=None, bootstrap=True):
+        super().__init__(db_name, instrument)
+        if isinstance(profile, dict):
+            self.profile = dict(PROFILES[DEFAULT_PROFILE], **profile)
+        else:
+            self.profile = PROFILES[profile or DEFAULT_PROFILE]
+        # One connection per thread, reused for the lifetime of this object
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.has_fts = True
+        self.has_stats = True
+        # Fields the file has no unique index for yet (it held duplicates);
+        # writes check them by hand until migrate() manages to build it
+        self.unchecked_unique = []
+        if cache_size is None:
+            cache_size = DEFAULT_CACHE_SIZE
+        self.cache = RecordCache(max_records=cache_size) if cache_size > 0 else None
+        self._checkpointer = None
+        self._checkpoint_stop = threading.Event()
+        self._backfiller = None
+        self._backfill_stop = threading.Event()
+        # Set if the last background backfill failed; the next start retries it
+        self.backfill_error = None
+        # bootstrap=False leaves the schema check to the caller (the GUIs run
+        # create_table as the worker's first job so the window opens sooner)
+        if bootstrap:
+            self.create_table()
+
+    @classmethod
+    def shared(cls, db_name="records.db", profile=None, bootstrap=True, engine=None):
+        # Process-wide instance so screens don't reconnect and re-run DDL.
+        # engine (default RMS_DB_ENGINE) picks what serves it; see ENGINES.
+        engine = engine or DEFAULT_ENGINE
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown storage engine {engine!r}")
+        with cls._shared_lock:
+            db = cls._shared.get(db_name)
+            if db is None:
+                if engine == "memory":
+                    db = MemoryStorage(db_name)
+                elif engine == "write_behind":
+                    db = WriteBehindStorage(cls(db_name, profile=profile, bootstrap=False), bootstrap=bootstrap)
+                else:
+                    db = cls(db_name, profile=profile, bootstrap=bootstrap)
+                cls._shared[db_name] = db
+            return db
 
     def get_connection(self):
-        return sqlite3.connect(self.db_name)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread is off only so close() can run from any thread;
+            # each connection is still used exclusively by the thread that opened it
+            if self.instrumentation is not None:
+                conn = sqlite3.connect(self.db_name, check_same_thread=False,
+                                       timeout=self.profile["busy_timeout_ms"] / 1000, factory=InstrumentedConnection)
+                conn.instrumentation = self.instrumentation
+                self.instrumentation.connection_opened()
+            else:
+                conn = sqlite3.connect(self.db_name, check_same_thread=False,
+                                       timeout=self.profile["busy_timeout_ms"] / 1000)
+            self._apply_profile(conn)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
 
-    def create_table(self):
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS records (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    age INTEGER,
-                    address TEXT,
-                    contact TEXT,
-                    email TEXT
-                )
-            """)
-            conn.commit()
+    def _apply_profile(self, conn):
+        profile = self.profile
+        # Only takes effect on a new, empty file (and on the next full VACUUM),
+        # so it has to come before journal_mode, which writes the header
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute(f"PRAGMA journal_mode={profile['journal_mode']}")
+        conn.execute(f"PRAGMA synchronous={profile['synchronous']}")
+        conn.execute(f"PRAGMA busy_timeout={int(profile['busy_timeout_ms'])}")
+        # Negative cache_size is in KiB rather than pages
+        conn.execute(f"PRAGMA cache_size=-{int(profile['cache_size_kb'])}")
+        conn.execute(f"PRAGMA mmap_size={int(profile['mmap_size'])}")
+
+    @instrumented
+    def checkpoint(self, mode="PASSIVE"):
+        # Folds the WAL back into the main file; PASSIVE never blocks readers or writers
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Unknown checkpoint mode {mode!r}")
+        cursor = self.get_connection().cursor()
+        cursor.execute(f"PRAGMA wal_checkpoint({mode})")
+        return cursor.fetchone()
+
+    def start_checkpointer(self):
+        # Background thread running a PASSIVE checkpoint every checkpoint_interval_s
+        interval = self.profile["checkpoint_interval_s"]
+        if not interval or self.profile["journal_mode"].upper() != "WAL" or self._checkpointer:
+            return
+        self._checkpoint_stop.clear()
+
+        def run():
+            while not self._checkpoint_stop.wait(interval):
+                try:
+                    self.checkpoint()
+                except sqlite3.Error:
+                    pass  # A busy checkpoint just waits for the next tick
+
+        self._checkpointer = threading.Thread(target=run, name="db-checkpoint", daemon=True)
+        self._checkpointer.start()
+
+    def _private_connection(self):
+        # Connection for one long maintenance job, outside the per-thread pool
+        # and in autocommit mode, so the job controls its own transactions
+        conn = sqlite3.connect(self.db_name, timeout=self.profile["busy_timeout_ms"] / 1000, isolation_level=None)
+        self._apply_profile(conn)
+        return conn
+
+    @instrumented
+    def backup(self, path, pages=BACKUP_PAGES, progress=None):
+        # Online copy to path with SQLite's backup API, pages at a time;
+        # progress(copied, total) runs after each step. In WAL mode the copy is
+        # read from one snapshot, so other desks keep writing and the copy never
+        # restarts (in the "safe" profile a write restarts it). The file is
+        # built next to path and renamed, so path only ever holds a whole backup.
+        # Returns the number of pages copied.
+        partial = path + ".part"
+        source = self._private_connection()
+        target = sqlite3.connect(partial)
+        try:
+            if self.profile["journal_mode"].upper() == "WAL":
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            source.backup(target, pages=pages,
+                          progress=progress and (lambda status, remaining, total: progress(total - remaining, total)))
+            copied = target.execute("PRAGMA page_count").fetchone()[0]
+        except BaseException:
+            target.close()
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        finally:
+            source.close()
+        target.close()
+        os.replace(partial, path)
+        return copied
+
+    @instrumented
+    def restore(self, path, progress=None):
+        # Replaces every row with the contents of a backup() file, which is
+        # checked first. Copied in one step, i.e. one write transaction, so
+        # other desks see either the old rows or the restored ones. The copy
+        # is staged in a scratch file next to this one first: a backup from an
+        # older version is upgraded there, and its record id and change-log
+        # sequences are raised past everything this file handed out before, so
+        # ids and seqs that peers (and list ETags) have already seen are never
+        # reused.
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No backup at {path}")
+        floors = self._sequences()
+        staging = self.db_name + ".restore"
+        if os.path.exists(staging):
+            os.remove(staging)
+        source = sqlite3.connect(path)
+        staged = sqlite3.connect(staging)
+        try:
+            # Thrown away either way, so no need to wait for the disk
+            staged.execute("PRAGMA synchronous=OFF")
+            status = source.execute("PRAGMA quick_check").fetchone()[0]
+            if status != "ok":
+                raise sqlite3.DatabaseError(f"{path} is damaged: {status}")
+            if source.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='records'").fetchone() is None:
+                raise ValueError(f"{path} is not a records database")
+            source.backup(staged)
+            run_migrations(staged)
+            restored = self._sequences(staged)
+            # The change log moves one past its old end, so the first
+            # last_change_seq() after the restore is one no client has seen
+            self._set_sequence(staged, "records", max(floors["records"], restored["records"]))
+            self._set_sequence(staged, "change_log", max(floors["change_log"], restored["change_log"]) + 1)
+            staged.commit()
+            target = self._private_connection()
+            try:
+                staged.backup(target, progress=progress and (
+                    lambda status, remaining, total: progress(total - remaining, total)))
+            finally:
+                target.close()
+        finally:
+            staged.close()
+            source.close()
+            if os.path.exists(staging):
+                os.remove(staging)
+        if self.cache is not None:
+            self.cache.invalidate()
+        self.migrate()
+
+    def _sequences(self, conn=None):
+        # Highest record id and change-log seq ever handed out in a file
+        conn = conn or self.get_connection()
+        found = {}
+        for table, key in (("records", "id"), ("change_log", "seq")):
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (table,)).fetchone()
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+            latest = conn.execute(f"SELECT COALESCE(MAX({key}), 0) FROM {table}").fetchone()[0] if exists else 0
+            found[table] = max(row[0] if row else 0, latest)
+        return found
+
+    def _set_sequence(self, conn, table, value):
+        if not conn.execute("UPDATE sqlite_sequence SET seq=? WHERE name=?", (value, table)).rowcount:
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, value))
 
+    @instrumented
+    def vacuum(self, pages=VACUUM_PAGES, progress=None):
+        # Hands pages freed by deletes back to the file system, pages at a time,
+        # each step a short write transaction; progress(freed, total). A file
+        # created before incremental vacuum was enabled gets one full VACUUM
+        # instead, which rewrites it and holds the write lock while it runs.
+        # Returns the number of pages freed.
+        conn = self._private_connection()
+        try:
+            total = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("VACUUM")
+                if progress:
+                    progress(total, total)
+                return total
+            left = total
+            while left:
+                # The pragma frees one page per step and execute() stops after the
+                # first (it returns no columns); executescript steps it to the end
+                conn.executescript(f"BEGIN IMMEDIATE; PRAGMA incremental_vacuum({int(pages)}); COMMIT;")
+                before, left = left, conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if progress:
+                    progress(max(total - left, 0), total)
+                if left >= before:
+                    break  # Other desks' deletes are freeing pages as fast; stop here
+            return max(total - left, 0)
+        finally:
+            conn.close()
+
+    @instrumented
+    def analyze(self):
+        # Refreshes the query planner's statistics (sqlite_stat1)
+        conn = self._private_connection()
+        try:
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
+
+    def run_in_background(self, task, *args, on_done=None, on_error=None, **kwargs):
+        # Runs a long job such as self.backup on a thread of its own, so the
+        # apps' worker queue keeps moving; on_done(result) / on_error(exc) run
+        # on that thread. Returns the thread.
+        def run():
+            try:
+                result = task(*args, **kwargs)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+                return
+            if on_done is not None:
+                on_done(result)
+
+        thread = threading.Thread(target=run, name="db-maintenance", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        if self._backfiller:
+            # Stops after the current chunk; the next start picks up from there
+            self._backfill_stop.set()
+            self._backfiller.join()
+            self._backfiller = None
+        if self._checkpointer:
+            self._checkpoint_stop.set()
+            self._checkpointer.join()
+            self._checkpointer = None
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+        super().close()
+
+    def _check_external_changes(self):
+        # data_version moves when any other connection commits (another desk, or
+        # another of our threads); our own writes already updated the cache
+        version = self.data_version()
+        last = getattr(self._local, "data_version", None)
+        self._local.data_version = version
+        if last is not None and version != last:
+            self.cache.invalidate()
+
+    def data_version(self):
+        # Changes whenever another connection commits to the file
+        return self.get_connection().execute("PRAGMA data_version").fetchone()[0]
+
+    @instrumented
+    def migrate(self, batch_size=BACKFILL_BATCH_SIZE, progress=None, backfill=True):
+        # Upgrades an older records.db (PRAGMA user_version) and, unless
+        # backfill is False, finishes any chunked backfill it registered or
+        # an interrupted upgrade left over
+        conn = self.get_connection()
+        applied = run_migrations(conn, batch_size=batch_size, progress=progress, backfill=backfill)
+        self._read_schema_state(conn)
+        if applied and self.cache is not None:
+            self.cache.invalidate()
+        return applied
+
+    def _read_schema_state(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='records_fts'")
+        # Search falls back to LIKE without FTS5 or while the index is still being filled
+        pending = pending_backfills(conn)
+        self.has_fts = cursor.fetchone() is not None and "records_fts" not in pending
+        # stats() aggregates the table itself until the counters are complete
+        self.has_stats = "record_stats" not in pending
+        self.unchecked_unique = non_unique_fields(conn)
+
+    @instrumented
+    def run_backfills(self, batch_size=BACKFILL_BATCH_SIZE, progress=None):
+        # Finishes pending backfills on a connection of its own, one short
+        # transaction per chunk; close() stops it between chunks
+        conn = self._private_connection()
+        try:
+            run_pending_backfills(conn, batch_size, progress, stop=self._backfill_stop)
+            self._read_schema_state(conn)
+        finally:
+            conn.close()
+        # Search switches from LIKE to the index, so cached results may differ
+        if self.cache is not None:
+            self.cache.invalidate()
+
+    def start_backfills(self):
+        # Runs run_backfills on a background thread if any are pending
+        if self._backfiller is not None and self._backfiller.is_alive():
+            return
+        if not pending_backfills(self.get_connection()):
+            return
+        self._backfill_stop.clear()
+        self.backfill_error = None
+
+        def failed(e):
+            self.backfill_error = e
+
+        self._backfiller = self.run_in_background(self.run_backfills, on_error=failed)
+
+    @instrumented
+    @retry_if_locked
     def add_record(self, name, age, address, contact, email):
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO records (name, age, address, contact, email) VALUES (?, ?, ?, ?, ?)",
-                           (name, age, address, contact, email))
-            conn.commit()
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                if self.unchecked_unique:
+                    cursor.execute("BEGIN IMMEDIATE")
+                    self._check_unique(cursor, name, email)
+                cursor.execute("INSERT INTO records (name, age, address, contact, email) VALUES (?, ?, ?, ?, ?)",
+                               (name, age, address, contact, email))
+                conn.commit()
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE" in str(e):
+                raise DuplicateRecordError("A record with this Name or Email already exists.") from e
+            raise
+        if self.cache is not None:
+            self.cache.record_written(cursor.lastrowid, Record(cursor.lastrowid, name, age, address, contact, email, 1))
+        self._notify("inserted", [cursor.lastrowid])
+        return cursor.lastrowid
 
-    def get_records(self):
+    @instrumented
+    @cached_query
+    def get_records(self, columns=None):
+        # columns projects the query (id is always included); other fields stay None
+        select, columns = self._projection(columns)
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM records")
+            cursor.row_factory = record_factory(columns)
+            cursor.execute(f"SELECT {select} FROM records")
             return cursor.fetchall()
 
+    def _projection(self, columns):
+        columns = projected_columns(columns)
+        if columns is None:
+            return SELECT_COLUMNS, None
+        return ", ".join(columns), columns
+
+    @instrumented
     def get_record_by_id(self, record_id):
+        generation = None
+        if self.cache is not None:
+            self._check_external_changes()
+            found, record = self.cache.get_record(record_id)
+            if found:
+                return record
+            generation = self.cache.generation
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM records WHERE id=?", (record_id,))
-            return cursor.fetchone()
+            cursor.row_factory = record_factory()
+            cursor.execute(f"SELECT {SELECT_COLUMNS} FROM records WHERE id=?", (record_id,))
+            record = cursor.fetchone()
+        if record is not None and self.cache is not None:
+            self.cache.put_record(record_id, record, generation)
+        return record
 
-    def update_record(self, record_id, name, age, address, contact, email):
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE records
-                SET name=?, age=?, address=?, contact=?, email=?
-                WHERE id=?
-            """, (name, age, address, contact, email, record_id))
-            conn.commit()
+    @instrumented
+    @retry_if_locked
+    def update_record(self, record_id, name, age, address, contact, email, expected_version=None):
+        # With expected_version (the version the caller read) the update only
+        # applies if the row is still at that version; otherwise ConflictError
+        where = "id=?" if expected_version is None else "id=? AND version=?"
+        params = (name, age, address, contact, email, record_id)
+        if expected_version is not None:
+            params += (expected_version,)
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                if self.unchecked_unique:
+                    cursor.execute("BEGIN IMMEDIATE")
+                    self._check_unique(cursor, name, email, record_id)
+                cursor.execute(f"""
+                    UPDATE records
+                    SET name=?, age=?, address=?, contact=?, email=?, version=version + 1
+                    WHERE {where}
+                """, params)
+                conn.commit()
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE" in str(e):
+                raise DuplicateRecordError("Another record with this Name or Email already exists.") from e
+            raise
+        if cursor.rowcount:
+            if self.cache is not None:
+                # A blind update doesn't know the new version, so the next read fetches it
+                record = None
+                if expected_version is not None:
+                    record = Record(record_id, name, age, address, contact, email, expected_version + 1)
+                self.cache.record_written(record_id, record)
+            self._notify("updated", [record_id])
+        elif expected_version is not None:
+            current = self._current_record(record_id)
+            if current is None:
+                raise ConflictError("This record has been deleted by another user.")
+            raise ConflictError("This record was changed by another user after you opened it.", current)
 
+    def _check_unique(self, cursor, name, email, record_id=None):
+        # The unique index's job, for the fields in unchecked_unique; run under
+        # the write lock. A record keeping a value it already shares with an
+        # old duplicate isn't blocked, only new collisions are.
+        current = (None, None)
+        if record_id is not None:
+            cursor.execute("SELECT name, email FROM records WHERE id=?", (record_id,))
+            current = cursor.fetchone() or current
+        clauses = []
+        params = []
+        if "name" in self.unchecked_unique and name != current[0]:
+            clauses.append("name=?")
+            params.append(name)
+        if "email" in self.unchecked_unique and (email or "").lower() != (current[1] or "").lower():
+            clauses.append("email=? COLLATE NOCASE")
+            params.append(email)
+        if not clauses:
+            return
+        cursor.execute(f"SELECT 1 FROM records WHERE ({' OR '.join(clauses)}) AND id IS NOT ? LIMIT 1",
+                       params + [record_id])
+        if cursor.fetchone() is not None:
+            raise DuplicateRecordError("A record with this Name or Email already exists." if record_id is None
+                                       else "Another record with this Name or Email already exists.")
+
+    def duplicates(self):
+        # {field: [(value, records)]} for the values blocking a unique index
+        conn = self.get_connection()
+        return {field: duplicate_values(conn, field) for field in non_unique_fields(conn)}
+
+    def _current_record(self, record_id):
+        # The row as committed right now, bypassing the cache (used after a conflict)
+        cursor = self.get_connection().cursor()
+        cursor.row_factory = record_factory()
+        cursor.execute(f"SELECT {SELECT_COLUMNS} FROM records WHERE id=?", (record_id,))
+        record = cursor.fetchone()
+        if self.cache is not None:
+            self.cache.record_written(record_id, record)
+        return record
+
+    @instrumented
+    def get_records_by_ids(self, ids):
+        cursor = self.get_connection().cursor()
+        cursor.row_factory = record_factory()
+        ids = list(ids)
+        rows = []
+        for start in range(0, len(ids), MAX_IN_PARAMS):
+            chunk = ids[start:start + MAX_IN_PARAMS]
+            cursor.execute(f"SELECT {SELECT_COLUMNS} FROM records WHERE id IN ({','.join('?' * len(chunk))}) ORDER BY id",
+                           chunk)
+            rows.extend(cursor.fetchall())
+        return rows
+
+    @instrumented
+    @cached_query
+    def get_records_page(self, after_id=None, limit=50, order_by="id", columns=None, filters=None):
+        # Keyset pagination: pass the id of the last row of the previous page.
+        # order_by is a column name, prefixed with "-" for descending order;
+        # filters is a dict of FILTERS keys, all applied in SQL.
+        column, descending, order = self._order_clause(order_by)
+        op = "<" if descending else ">"
+        clauses, params = self._filter_clause(filters)
+        cursor = self.get_connection().cursor()
+        # The rows after the anchor, in page order, as index ranges. NULLs sort
+        # first and a row-value comparison never matches them, so they get a
+        # range of their own
+        ranges = [("", [])]
+        if after_id is not None:
+            if column == "id":
+                ranges = [(f"id {op} ?", [after_id])]
+            else:
+                cursor.execute(f"SELECT {column} FROM records WHERE id=?", (after_id,))
+                anchor = cursor.fetchone()
+                if anchor is None:
+                    return []
+                collate = SORT_COLLATIONS.get(column, "")
+                if anchor[0] is None:
+                    ranges = [(f"{column} IS NULL AND id {op} ?", [after_id])]
+                    if not descending:
+                        ranges.append((f"{column} IS NOT NULL", []))
+                else:
+                    ranges = [(f"({column}, id) {op} (?{collate}, ?)", [anchor[0], after_id])]
+                    if descending:
+                        ranges.append((f"{column} IS NULL", []))
+        select, columns = self._projection(columns)
+        cursor.row_factory = record_factory(columns)
+        page = []
+        for clause, values in ranges:
+            where = " AND ".join(clauses + [clause] if clause else clauses)
+            cursor.execute(f"SELECT {select} FROM records {'WHERE ' + where if where else ''} "
+                           f"ORDER BY {order} LIMIT ?", params + values + [limit - len(page)])
+            page.extend(cursor.fetchall())
+            if len(page) >= limit:
+                break
+        return page
+
+    def _filter_clause(self, filters):
+        clauses = []
+        params = []
+        for key, value in (filters or {}).items():
+            if value is None or value == "":
+                continue
+            if key == "age_min":
+                clauses.append("age >= ?")
+                params.append(int(value))
+            elif key == "age_max":
+                clauses.append("age <= ?")
+                params.append(int(value))
+            elif key == "email_domain":
+                clauses.append(f"{EMAIL_DOMAIN_SQL} = ?")
+                params.append(str(value).lstrip("@").lower())
+            elif key == "name_prefix":
+                escaped = str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                clauses.append("name LIKE ? ESCAPE '\\'")
+                params.append(escaped + "%")
+            else:
+                raise ValueError(f"Unknown filter {key!r}")
+        return clauses, params
+
+    def _order_clause(self, order_by):
+        descending = order_by.startswith("-")
+        column = order_by.lstrip("-")
+        if column not in COLUMNS:
+            raise ValueError(f"Cannot order by {order_by!r}")
+        direction = "DESC" if descending else "ASC"
+        # id breaks ties so the ordering is total and keyset-safe
+        collate = SORT_COLLATIONS.get(column, "")
+        order = f"id {direction}" if column == "id" else f"{column}{collate} {direction}, id {direction}"
+        return column, descending, order
+
+    @instrumented
+    @cached_query
+    def id_at_offset(self, offset, order_by="id"):
+        # Anchor for jumping straight to a page without fetching the ones before it
+        order = self._order_clause(order_by)[2]
+        cursor = self.get_connection().cursor()
+        cursor.execute(f"SELECT id FROM records ORDER BY {order} LIMIT 1 OFFSET ?", (offset,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def iter_records(self, batch_size=500, columns=None):
+        # Streams the table in id order without materialising it
+        select, columns = self._projection(columns)
+        cursor = self.get_connection().cursor()
+        cursor.row_factory = record_factory(columns)
+        cursor.execute(f"SELECT {select} FROM records ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+    @instrumented
+    @cached_query
+    def count_records(self, filters=None):
+        clauses, params = self._filter_clause(filters)
+        where = "WHERE " + " AND ".join(clauses) if clauses else ""
+        cursor = self.get_connection().cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM records {where}", params)
+        return cursor.fetchone()[0]
+
+    @instrumented
+    @cached_query
+    def search(self, query, limit=50):
+        # Every word must match as a prefix of some field; best matches first
+        tokens = SEARCH_TOKEN_RE.findall(query)
+        if not tokens:
+            return []
+        cursor = self.get_connection().cursor()
+        cursor.row_factory = record_factory()
+        if self.has_fts:
+            match = " ".join(f'"{token}"*' for token in tokens)
+            select = ", ".join(f"records.{column}" for column in RECORD_COLUMNS)
+            cursor.execute(f"""
+                SELECT {select} FROM records_fts
+                JOIN records ON records.id = records_fts.rowid
+                WHERE records_fts MATCH ?
+                ORDER BY records_fts.rank
+                LIMIT ?
+            """, (match, limit))
+        else:
+            clauses = " AND ".join("(name LIKE ? OR address LIKE ? OR email LIKE ? OR contact LIKE ?)"
+                                   for _ in tokens)
+            params = [f"%{token}%" for token in tokens for _ in range(4)]
+            cursor.execute(f"SELECT {SELECT_COLUMNS} FROM records WHERE {clauses} ORDER BY name LIMIT ?",
+                           params + [limit])
+        return cursor.fetchall()
+
+    @instrumented
+    @cached_query
+    def stats(self, top_domains=10):
+        # Dashboard figures: {"total": n, "by_age": [(bracket, count)] for every
+        # bracket in AGE_LABELS order, "by_domain": [(domain, count)] for the
+        # top_domains most common, "domains": distinct domains}. Read from the
+        # trigger-maintained record_stats counters, a few rows whatever the
+        # table size; aggregated with GROUP BY while those are still being filled.
+        cursor = self.get_connection().cursor()
+        if not self.has_stats:
+            return self._aggregate_stats(cursor, top_domains)
+        cursor.execute("SELECT count FROM record_stats WHERE kind = 'total' AND key = ''")
+        total = cursor.fetchone()[0]
+        cursor.execute("SELECT key, count FROM record_stats WHERE kind = 'age'")
+        ages = dict(cursor.fetchall())
+        cursor.execute("SELECT key, count FROM record_stats WHERE kind = 'domain' ORDER BY count DESC, key LIMIT ?",
+                       (top_domains,))
+        by_domain = cursor.fetchall()
+        cursor.execute("SELECT COUNT(*) FROM record_stats WHERE kind = 'domain'")
+        domains = cursor.fetchone()[0]
+        return {"total": total, "by_age": [(label, ages.get(label, 0)) for label in AGE_LABELS],
+                "by_domain": by_domain, "domains": domains}
+
+    def _aggregate_stats(self, cursor, top_domains=10):
+        # stats() computed from the rows themselves (a full scan of records)
+        cursor.execute("SELECT COUNT(*) FROM records")
+        total = cursor.fetchone()[0]
+        cursor.execute(f"SELECT {age_bracket_sql('age')}, COUNT(*) FROM records GROUP BY 1")
+        ages = dict(cursor.fetchall())
+        cursor.execute(f"SELECT COALESCE({EMAIL_DOMAIN_SQL}, ''), COUNT(*) FROM records GROUP BY 1 "
+                       f"ORDER BY 2 DESC, 1 LIMIT ?", (top_domains,))
+        by_domain = cursor.fetchall()
+        cursor.execute(f"SELECT COUNT(DISTINCT COALESCE({EMAIL_DOMAIN_SQL}, '')) FROM records")
+        domains = cursor.fetchone()[0]
+        return {"total": total, "by_age": [(label, ages.get(label, 0)) for label in AGE_LABELS],
+                "by_domain": by_domain, "domains": domains}
+
+    @instrumented
     def verify_not_exists(self, name, email, exclude_id=None):
         with self.get_connection() as conn:
             cursor = conn.cursor()
             if exclude_id:
-                cursor.execute("SELECT id FROM records WHERE (name=? OR email=?) AND id != ?", (name, email, exclude_id))
+                cursor.execute("SELECT id FROM records WHERE (name=? OR email=? COLLATE NOCASE) AND id != ?",
+                               (name, email, exclude_id))
             else:
-                cursor.execute("SELECT id FROM records WHERE name=? OR email=?", (name, email))
+                cursor.execute("SELECT id FROM records WHERE name=? OR email=? COLLATE NOCASE", (name, email))
             return cursor.fetchone() is None
 
-    def delete_record(self, record_id):
+    @instrumented
+    @retry_if_locked
+    def delete_record(self, record_id, expected_version=None):
+        # expected_version works as in update_record; a row that is already
+        # gone is not a conflict
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("DELETE FROM records WHERE id=?", (record_id,))
+            if expected_version is None:
+                cursor.execute("DELETE FROM records WHERE id=?", (record_id,))
+            else:
+                cursor.execute("DELETE FROM records WHERE id=? AND version=?", (record_id, expected_version))
             conn.commit()
+        if cursor.rowcount:
+            if self.cache is not None:
+                self.cache.record_written(record_id)
+            self._notify("deleted", [record_id])
+        elif expected_version is not None:
+            current = self._current_record(record_id)
+            if current is not None:
+                raise ConflictError("This record was changed by another user after you opened it.", current)
+
+    @instrumented
+    @retry_if_locked
+    def delete_records(self, ids):
+        # Deletes many records in one transaction; returns the ids that existed
+        ids = list(dict.fromkeys(ids))
+        deleted = []
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            for start in range(0, len(ids), MAX_IN_PARAMS):
+                chunk = ids[start:start + MAX_IN_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                cursor.execute(f"SELECT id FROM records WHERE id IN ({placeholders})", chunk)
+                deleted.extend(row[0] for row in cursor.fetchall())
+                cursor.execute(f"DELETE FROM records WHERE id IN ({placeholders})", chunk)
+        if deleted:
+            deleted.sort()
+            if self.cache is not None:
+                for record_id in deleted:
+                    self.cache.record_written(record_id)
+            self._notify("deleted", deleted)
+        return deleted
+
+    @instrumented
+    @retry_if_locked
+    def update_records(self, changes):
+        # changes maps record id -> {field: new value} (only the fields to change).
+        # All updates commit together; a duplicate name/email rolls back the batch.
+        changes = {record_id: dict(fields) for record_id, fields in dict(changes).items() if fields}
+        for fields in changes.values():
+            unknown = [f for f in fields if f not in FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        # Rows changing the same set of columns share one executemany
+        groups = {}
+        for record_id, fields in changes.items():
+            names = tuple(f for f in FIELDS if f in fields)
+            groups.setdefault(names, []).append(tuple(fields[f] for f in names) + (record_id,))
+        updated = []
+        conn = self.get_connection()
+        try:
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                if set(self.unchecked_unique) & {f for fields in changes.values() for f in fields}:
+                    self._check_unique_batch(cursor, changes)
+                for names, params in groups.items():
+                    assignments = ", ".join(f"{name}=?" for name in names) + ", version=version + 1"
+                    cursor.executemany(f"UPDATE records SET {assignments} WHERE id=?", params)
+                ids = list(changes)
+                for start in range(0, len(ids), MAX_IN_PARAMS):
+                    chunk = ids[start:start + MAX_IN_PARAMS]
+                    cursor.execute(f"SELECT id FROM records WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                    updated.extend(row[0] for row in cursor.fetchall())
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE" in str(e):
+                raise DuplicateRecordError("Another record with this Name or Email already exists.") from e
+            raise
+        if updated:
+            updated.sort()
+            if self.cache is not None:
+                for record_id in updated:
+                    self.cache.record_written(record_id)
+            self._notify("updated", updated)
+        return updated
+
+    def _check_unique_batch(self, cursor, changes):
+        # _check_unique for update_records, including collisions within the batch
+        taken = {}
+        for record_id, fields in changes.items():
+            cursor.execute("SELECT name, email FROM records WHERE id=?", (record_id,))
+            current = cursor.fetchone()
+            if current is None:
+                continue
+            name = fields.get("name", current[0])
+            email = fields.get("email", current[1])
+            self._check_unique(cursor, name, email, record_id)
+            for field, value in (("name", name), ("email", (email or "").lower())):
+                if field in self.unchecked_unique and field in fields:
+                    if taken.setdefault((field, value), record_id) != record_id:
+                        raise DuplicateRecordError("Another record with this Name or Email already exists.")
+
+    @instrumented
+    def add_records(self, rows, batch_size=500):
+        # Bulk insert in one transaction; returns (inserted, rejects) where each
+        # reject is (row_number, row, reason) with 1-based row numbers
+        inserted = 0
+        rejects = []
+        seen_names = set()
+        seen_emails = set()
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.cursor()
+            # Take the write lock up front so the duplicate check can't race other writers
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM records")
+            last_id = cursor.fetchone()[0]
+            batch = []
+            for number, row in enumerate(rows, start=1):
+                batch.append((number, row))
+                if len(batch) >= batch_size:
+                    inserted += self._insert_batch(cursor, batch, seen_names, seen_emails, rejects)
+                    batch = []
+            if batch:
+                inserted += self._insert_batch(cursor, batch, seen_names, seen_emails, rejects)
+            # The write lock was held throughout, so every id above last_id is ours
+            cursor.execute("SELECT id FROM records WHERE id > ? ORDER BY id", (last_id,))
+            new_ids = [row[0] for row in cursor.fetchall()]
+        if new_ids and self.cache is not None:
+            self.cache.invalidate()
+        self._notify("inserted", new_ids)
+        rejects.sort(key=lambda reject: reject[0])
+        return inserted, rejects
+
+    def _insert_batch(self, cursor, batch, seen_names, seen_emails, rejects):
+        # Same rules as the forms, checked column-wise for the whole batch
+        candidates = []
+        clean_rows, errors = validate_rows([row for _, row in batch])
+        for (number, row), clean, row_errors in zip(batch, clean_rows, errors):
+            if row_errors:
+                rejects.append((number, row, "; ".join(row_errors)))
+            else:
+                candidates.append((number, row, clean))
+
+        # One set-wise lookup per batch instead of a verify_not_exists per row
+        names = list({clean[0] for _, _, clean in candidates} - seen_names)
+        emails = list({clean[4].lower() for _, _, clean in candidates} - seen_emails)
+        existing_names, existing_emails = self._find_existing(cursor, names, emails)
+        taken_names = seen_names | existing_names
+        taken_emails = seen_emails | existing_emails
+
+        to_insert = []
+        for number, row, clean in candidates:
+            name, email = clean[0], clean[4].lower()
+            if name in taken_names or email in taken_emails:
+                rejects.append((number, row, "Duplicate name or email"))
+                continue
+            taken_names.add(name)
+            taken_emails.add(email)
+            seen_names.add(name)
+            seen_emails.add(email)
+            to_insert.append(clean)
+
+        cursor.executemany("INSERT INTO records (name, age, address, contact, email) VALUES (?, ?, ?, ?, ?)",
+                           to_insert)
+        return len(to_insert)
+
+    def _find_existing(self, cursor, names, emails):
+        existing_names = set()
+        existing_emails = set()
+        for start in range(0, len(names), MAX_IN_PARAMS):
+            chunk = names[start:start + MAX_IN_PARAMS]
+            cursor.execute(f"SELECT name FROM records WHERE name IN ({','.join('?' * len(chunk))})", chunk)
+            existing_names.update(r[0] for r in cursor.fetchall())
+        for start in range(0, len(emails), MAX_IN_PARAMS):
+            chunk = emails[start:start + MAX_IN_PARAMS]
+            cursor.execute(f"SELECT email FROM records WHERE email COLLATE NOCASE IN ({','.join('?' * len(chunk))})",
+                           chunk)
+            existing_emails.update(r[0].lower() for r in cursor.fetchall())
+        return existing_names, existing_emails
+
+    def id_sequence(self):
+        # Highest id ever handed out (AUTOINCREMENT never reuses one, even after deletes)
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name='records'")
+        row = cursor.fetchone()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM records")
+        return max(row[0] if row else 0, cursor.fetchone()[0])
+
+    @retry_if_locked
+    def reserve_ids(self, count):
+        # Moves AUTOINCREMENT past count ids and returns the first, so rows
+        # WriteBehindStorage adds before saving them can't collide with rows
+        # other connections add meanwhile
+        conn = self.get_connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            first = self.id_sequence() + 1
+            self._set_sequence(conn, "records", first + count - 1)
+        return first
+
+    @instrumented
+    @retry_if_locked
+    def write_back(self, ids, records, versions):
+        # Makes the rows with these ids match records (ids without a record are
+        # deleted), keeping their ids. Used by WriteBehindStorage's flush: the
+        # rows are deleted and re-inserted in one transaction, so names or
+        # emails moving between them can't collide half way through. versions
+        # maps id -> the version the row had when it was read (no entry: it was
+        # added since); a row whose version here differs is left alone and its
+        # id returned among the conflicts.
+        ids = list(ids)
+        saved = {record.id for record in records}
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            # Rows that came from another database keep their sync identity
+            stored = {}
+            for start in range(0, len(ids), MAX_IN_PARAMS):
+                chunk = ids[start:start + MAX_IN_PARAMS]
+                cursor.execute(f"SELECT id, version, origin, origin_id FROM records "
+                               f"WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                stored.update((row[0], row[1:]) for row in cursor.fetchall())
+            # Deleting a row that is already gone isn't a conflict
+            conflicts = [i for i in ids if (stored[i][0] if i in stored else None) != versions.get(i)
+                         and (i in saved or i in stored)]
+            skip = set(conflicts)
+            ids = [i for i in ids if i not in skip]
+            for start in range(0, len(ids), MAX_IN_PARAMS):
+                chunk = ids[start:start + MAX_IN_PARAMS]
+                cursor.execute(f"DELETE FROM records WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            cursor.executemany(f"INSERT INTO records ({SELECT_COLUMNS}, origin, origin_id) "
+                               f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (record.as_tuple() + (record.version or 1,) + stored.get(record.id, (0, None, None))[1:]
+                                for record in records if record.id not in skip))
+        if self.cache is not None:
+            self.cache.invalidate()
+        return conflicts
+
+    def replica_id(self):
+        # Random id naming this file in the delta files it exports
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT id FROM sync_replica")
+        return cursor.fetchone()[0]
+
+    def last_change_seq(self):
+        # The highest seq handed out, which a restore() moves past the log's
+        # last entry, so the value never repeats
+        cursor = self.get_connection().cursor()
+        cursor.execute("""
+            SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name='change_log'), 0),
+                       COALESCE((SELECT MAX(seq) FROM change_log), 0))
+        """)
+        return cursor.fetchone()[0]
+
+    def changes_since(self, seq=0, upto=None, batch_size=500, exclude_source=None):
+        # Streams each record changed after seq (up to upto, default: now) once,
+        # as its latest change, in seq order: dicts with seq, op ("insert",
+        # "update" or "delete"), id (here), origin and origin_id (the record's
+        # identity in every database), version and, except for deletes, the
+        # fields. Changes that were applied from exclude_source (a replica id)
+        # are left out: that database has them already. Read a page at a time,
+        # so no transaction stays open between pages.
+        if upto is None:
+            upto = self.last_change_seq()
+        replica = self.replica_id()
+        cursor = self.get_connection().cursor()
+        while True:
+            cursor.execute("""
+                SELECT seq, op, record_id, COALESCE(origin, ?), COALESCE(origin_id, record_id),
+                       version, name, age, address, contact, email
+                FROM change_log AS c
+                WHERE seq > ? AND seq <= ? AND (? IS NULL OR source IS NOT ?) AND NOT EXISTS (
+                    SELECT 1 FROM change_log AS later
+                    WHERE later.record_id = c.record_id AND later.seq > c.seq AND later.seq <= ?)
+                ORDER BY seq
+                LIMIT ?
+            """, (replica, seq, upto, exclude_source, exclude_source, upto, batch_size))
+            rows = cursor.fetchall()
+            for row in rows:
+                change = {"seq": row[0], "op": row[1], "id": row[2], "origin": row[3], "origin_id": row[4],
+                          "version": row[5]}
+                if row[1] != "delete":
+                    change.update(zip(FIELDS, row[6:]))
+                yield change
+            if len(rows) < batch_size:
+                break
+            seq = rows[-1][0]
+
+    def synced_seq(self, source):
+        # Last seq applied here from the database whose replica_id is source
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT last_seq FROM sync_peers WHERE replica_id=?", (source,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    @instrumented
+    def apply_changes(self, changes, source, since=0, upto=0):
+        # Applies changes_since(since, upto) output from the database whose
+        # replica_id is source, in one transaction. Rows are matched by
+        # (origin, origin_id), never by local id, and a change only applies if
+        # its version is newer than the row here. Entries at or below the seq
+        # already applied from source are skipped, so applying a delta twice
+        # changes nothing. Returns (applied, skipped, rejects); a reject is
+        # (seq, id, reason): a name or email another row here already has, or
+        # a row changed on both sides since the last sync.
+        replica = self.replica_id()
+        if source == replica:
+            raise ValueError("This delta was exported from this database.")
+        events = {"inserted": [], "updated": [], "deleted": []}
+        applied = skipped = 0
+        rejects = []
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT last_seq FROM sync_peers WHERE replica_id=?", (source,))
+            row = cursor.fetchone()
+            last_seq = row[0] if row else 0
+            if since > last_seq:
+                raise ValueError(f"The delta starts after seq {since}, but changes from this source are only "
+                                 f"applied up to {last_seq}; export it again with --since {last_seq}.")
+            # Everything logged from here on comes from source; marked below
+            cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+            logged_before = cursor.fetchone()[0]
+            for change in changes:
+                if change["seq"] <= last_seq:
+                    skipped += 1
+                    continue
+                upto = max(upto, change["seq"])
+                # Delta files from before record origins carry the source's own ids
+                origin = change.get("origin", source)
+                origin_id = change.get("origin_id", change["id"])
+                version = change.get("version")
+                if origin == replica:
+                    cursor.execute("SELECT id, version, name, age, address, contact, email FROM records "
+                                   "WHERE id=? AND origin IS NULL", (origin_id,))
+                else:
+                    cursor.execute("SELECT id, version, name, age, address, contact, email FROM records "
+                                   "WHERE origin=? AND origin_id=?", (origin, origin_id))
+                local = cursor.fetchone()
+                if change["op"] == "delete":
+                    if local is not None and version is not None and local[1] > version:
+                        rejects.append((change["seq"], change["id"], "Changed here after it was deleted there"))
+                        continue
+                    if local is not None:
+                        cursor.execute("DELETE FROM records WHERE id=?", (local[0],))
+                        events["deleted"].append(local[0])
+                    applied += 1
+                    continue
+                values = tuple(change[field] for field in FIELDS)
+                if local is not None and (version < local[1] or (version == local[1] and values == local[2:])):
+                    # Already here (e.g. our own change coming back), or older than what we have
+                    skipped += 1
+                    continue
+                if local is not None and version == local[1]:
+                    rejects.append((change["seq"], change["id"], "Changed in both databases since the last sync"))
+                    continue
+                if local is None and origin == replica:
+                    # One of ours that was deleted here: only a newer version
+                    # than the one deleted brings it back, not an echo of it
+                    cursor.execute("SELECT version FROM change_log WHERE record_id=? AND op='delete' "
+                                   "AND origin IS NULL ORDER BY seq DESC LIMIT 1", (origin_id,))
+                    deleted = cursor.fetchone()
+                    if deleted is not None and (deleted[0] is None or version <= deleted[0]):
+                        skipped += 1
+                        continue
+                try:
+                    if self.unchecked_unique:
+                        self._check_unique(cursor, change["name"], change["email"], local and local[0])
+                    if local is not None:
+                        cursor.execute("UPDATE records SET name=?, age=?, address=?, contact=?, email=?, version=? "
+                                       "WHERE id=?", values + (version, local[0]))
+                        events["updated"].append(local[0])
+                    elif origin == replica:
+                        # One of ours, deleted here since; AUTOINCREMENT never reused its id
+                        cursor.execute(f"INSERT INTO records ({SELECT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                       (origin_id,) + values + (version,))
+                        events["inserted"].append(origin_id)
+                    else:
+                        cursor.execute(f"INSERT INTO records ({', '.join(FIELDS)}, version, origin, origin_id) "
+                                       f"VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values + (version, origin, origin_id))
+                        events["inserted"].append(cursor.lastrowid)
+                except sqlite3.IntegrityError:
+                    rejects.append((change["seq"], change["id"], "Duplicate name or email"))
+                    continue
+                applied += 1
+            cursor.execute("UPDATE change_log SET source=? WHERE seq > ?", (source, logged_before))
+            if upto > last_seq:
+                cursor.execute("INSERT OR REPLACE INTO sync_peers (replica_id, last_seq) VALUES (?, ?)",
+                               (source, upto))
+        if self.cache is not None and any(events.values()):
+            self.cache.invalidate()
+        for event, ids in events.items():
+            self._notify(event, sorted(ids))
+        return applied, skipped, rejects
+
+    @instrumented
+    def export_changes(self, path, since=0, target=None):
+        # Delta file: a JSON header line naming this replica and the seq range,
+        # then one JSON line per change. With target (the receiving database's
+        # replica_id) the changes that came from it are left out. Returns
+        # (changes written, upto).
+        upto = self.last_change_seq()
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"replica": self.replica_id(), "since": since, "upto": upto}) + "\n")
+            for change in self.changes_since(since, upto, exclude_source=target):
+                f.write(json.dumps(change) + "\n")
+                count += 1
+        return count, upto
+
+    @instrumented
+    def import_changes(self, path):
+        # Applies a file written by export_changes; see apply_changes
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if "replica" not in header:
+                raise ValueError(f"{path} is not a delta file")
+            changes = (json.loads(line) for line in f if line.strip())
+            return self.apply_changes(changes, header["replica"], header["since"], header["upto"])
+
+    @instrumented
+    def export_csv(self, path):
+        # Plain tuples straight off the cursor; no Records to build
+        count = 0
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("id",) + FIELDS)
+            cursor = self.get_connection().cursor()
+            cursor.execute("SELECT id, name, age, address, contact, email FROM records ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                count += len(rows)
+        return count
@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+from tkinter import messagebox
+
+class DbWorker:
+    # Runs Database calls on a dedicated thread so the Tk event loop never waits
+    # on SQLite. Results, errors and change notifications are queued back and
+    # delivered on the Tk thread by polling with after().
+    POLL_MS = 30
+
+    def __init__(self, root, db):
+        self.root = root
+        self.db = db
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._pending = 0
+        self._busy_callbacks = []
+        self._listeners = []
+        self._stopped = False
+        # The worker thread opens its own connection through Database's per-thread pool
+        self._thread = threading.Thread(target=self._run, name="db-worker", daemon=True)
+        self._thread.start()
+        db.subscribe(self._on_db_change)
+        self._poll_id = root.after(self.POLL_MS, self._poll)
+
+    def submit(self, func, *args, on_done=None, on_error=None, **kwargs):
+        # func runs on the worker thread; on_done(result) / on_error(exc) run on the Tk thread
+        self._pending += 1
+        if self._pending == 1:
+            self._notify_busy(True)
+        self._requests.put((func, args, kwargs, on_done, on_error, time.perf_counter()))
+
+    def subscribe(self, callback):
+        # Like Database.subscribe, but callback(event, ids) is invoked on the Tk thread
+        self._listeners.append(callback)
+
+    def on_busy(self, callback):
+        # callback(busy) fires when the queue goes from idle to busy and back
+        self._busy_callbacks.append(callback)
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        self.db.unsubscribe(self._on_db_change)
+        self.root.after_cancel(self._poll_id)
+        self._requests.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+            func, args, kwargs, on_done, on_error, submitted = item
+            if self.db.instrumentation is not None:
+                # Time spent queued behind earlier requests
+                self.db.instrumentation.record_timing("DbWorker.queue_wait", time.perf_counter() - submitted)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self._results.put(("error", on_error, e))
+            else:
+                self._results.put(("done", on_done, result))
+
+    def _on_db_change(self, event, ids):
+        # Called on whichever thread wrote; hand it to the Tk thread
+        self._results.put(("event", None, (event, ids)))
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    kind, callback, payload = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == "event":
+                    for listener in list(self._listeners):
+                        listener(*payload)
+                    continue
+                self._pending -= 1
+                if self._pending == 0:
+                    self._notify_busy(False)
+                if callback and self.db.instrumentation is not None:
+                    # Tk-side handling (mostly widget work), separate from the DB call itself
+                    name = getattr(callback, "__qualname__", type(callback).__name__)
+                    self.db.instrumentation.timed(f"Tk {name}", callback, payload)
+                elif callback:
+                    callback(payload)
+                elif kind == "error":
+                    messagebox.showerror("Error", str(payload))
+        finally:
+            # Keep polling even if a callback raised
+            if not self._stopped:
+                self._poll_id = self.root.after(self.POLL_MS, self._poll)
+
+    def _notify_busy(self, busy):
+        for callback in self._busy_callbacks:
+            callback(busy)
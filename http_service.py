@@ -0,0 +1,313 @@
+import argparse
+import json
+import re
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from database import ConflictError, Database, DuplicateRecordError
+from storage import FILTERS, RECORD_COLUMNS
+from validation import FIELDS, validate_record
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Request threads; each keeps its own SQLite connection (Database's per-thread pool)
+WORKER_THREADS = 8
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BODY_BYTES = 64 * 1024
+EXPORT_BATCH_SIZE = 1000
+RECORD_PATH = re.compile(r"/records/(\d+)")
+
+
+def record_json(record):
+    return {column: getattr(record, column) for column in RECORD_COLUMNS}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+class RecordService(HTTPServer):
+    # JSON over HTTP for the web portal, on the same records.db the Tk apps use.
+    # Requests are handled by a fixed pool of threads rather than a thread per
+    # connection, so the number of open SQLite connections stays at `workers`.
+    # A keep-alive client holds a thread until it goes idle for IDLE_TIMEOUT_S.
+    daemon_threads = True
+
+    def __init__(self, db, address=(DEFAULT_HOST, DEFAULT_PORT), workers=WORKER_THREADS, quiet=False):
+        super().__init__(address, RecordRequestHandler)
+        self.db = db
+        self.quiet = quiet
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-worker")
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+
+
+class RecordRequestHandler(BaseHTTPRequestHandler):
+    # Routes:
+    #   GET    /records?after=&limit=&order=&<filter>=   one keyset page (ETag)
+    #   POST   /records                                  create
+    #   GET    /records/<id>                             one record (ETag = version)
+    #   PUT    /records/<id>                             replace (If-Match: version)
+    #   DELETE /records/<id>                             delete (If-Match: version)
+    #   GET    /search?q=&limit=                         full-text search
+    #   GET    /export                                   every record as NDJSON, streamed
+    #   GET    /stats                                    totals and histograms
+    protocol_version = "HTTP/1.1"
+    server_version = "RecordService/1.0"
+    IDLE_TIMEOUT_S = 5
+    timeout = IDLE_TIMEOUT_S
+    # Headers and body go out as separate writes; without this every
+    # keep-alive response waits out the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        match = RECORD_PATH.fullmatch(url.path)
+        routes = {
+            ("GET", "/records"): self.list_records,
+            ("POST", "/records"): self.create_record,
+            ("GET", "/search"): self.search,
+            ("GET", "/export"): self.export,
+            ("GET", "/stats"): self.stats,
+        }
+        try:
+            if match:
+                handler = {"GET": self.get_record, "PUT": self.update_record,
+                           "DELETE": self.delete_record}.get(method)
+                if handler is None:
+                    raise HttpError(405, f"{method} is not allowed here")
+                handler(int(match.group(1)))
+            elif (method, url.path) in routes:
+                routes[(method, url.path)]()
+            else:
+                raise HttpError(404, f"No route for {method} {url.path}")
+        except HttpError as e:
+            self.send_json(e.status, dict({"error": str(e)}, **e.details))
+        except DuplicateRecordError as e:
+            self.send_json(409, {"error": str(e)})
+        except ConflictError as e:
+            if e.current is None:
+                self.send_json(404, {"error": str(e)})
+            else:
+                self.send_json(412, {"error": str(e), "current": record_json(e.current)})
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+        except sqlite3.OperationalError as e:
+            # Still locked after the retries: tell the client to come back
+            if "locked" in str(e) or "busy" in str(e):
+                self.send_json(503, {"error": "The database is busy, try again"}, {"Retry-After": "1"})
+            else:
+                raise
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_not_modified(self, etag):
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def not_modified(self, etag):
+        # If-None-Match may list several tags, or "*"
+        header = self.headers.get("If-None-Match")
+        if header is None:
+            return False
+        tags = [tag.strip() for tag in header.split(",")]
+        return "*" in tags or etag in tags
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Request body too large")
+        try:
+            body = json.loads(self.rfile.read(length) or b"null")
+        except ValueError:
+            raise HttpError(400, "Request body is not valid JSON")
+        if not isinstance(body, dict):
+            raise HttpError(400, "Expected a JSON object")
+        return body
+
+    def read_record(self):
+        body = self.read_json()
+        clean, errors = validate_record(*(body.get(field) for field in FIELDS))
+        if errors:
+            raise HttpError(400, "Invalid record", errors=errors)
+        return clean
+
+    def expected_version(self):
+        # If-Match: "<version>" (from the ETag of GET /records/<id>)
+        header = self.headers.get("If-Match")
+        if header is None:
+            return None
+        tag = header.strip().removeprefix("W/").strip('"')
+        if not tag.isdigit():
+            raise HttpError(400, "If-Match must be a record version ETag")
+        return int(tag)
+
+    def int_param(self, name, default=None, low=None, high=None):
+        value = self.query.get(name)
+        if value is None or value == "":
+            return default
+        if not value.lstrip("-").isdigit():
+            raise HttpError(400, f"{name} must be a whole number")
+        value = int(value)
+        if low is not None:
+            value = max(value, low)
+        if high is not None:
+            value = min(value, high)
+        return value
+
+    def list_records(self):
+        db = self.server.db
+        limit = self.int_param("limit", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        after = self.int_param("after")
+        order = self.query.get("order", "id")
+        filters = {key: self.query[key] for key in FILTERS if key in self.query}
+        # Every committed write appends to the change log, so its last seq
+        # tags the data any page was read from; a match skips the query
+        etag = f'W/"{db.last_change_seq()}"'
+        if self.not_modified(etag):
+            self.send_not_modified(etag)
+            return
+        page = db.get_records_page(after_id=after, limit=limit, order_by=order, filters=filters)
+        next_after = page[-1].id if len(page) == limit else None
+        self.send_json(200, {"records": [record_json(record) for record in page], "next_after": next_after},
+                       {"ETag": etag, "Cache-Control": "no-cache"})
+
+    def get_record(self, record_id):
+        record = self.server.db.get_record_by_id(record_id)
+        if record is None:
+            raise HttpError(404, f"No record {record_id}")
+        etag = f'"{record.version}"'
+        if self.not_modified(etag):
+            self.send_not_modified(etag)
+            return
+        self.send_json(200, record_json(record), {"ETag": etag, "Cache-Control": "no-cache"})
+
+    def create_record(self):
+        clean = self.read_record()
+        db = self.server.db
+        record = db.get_record_by_id(db.add_record(*clean))
+        self.send_json(201, record_json(record), {"Location": f"/records/{record.id}",
+                                                  "ETag": f'"{record.version}"'})
+
+    def update_record(self, record_id):
+        clean = self.read_record()
+        db = self.server.db
+        expected = self.expected_version()
+        if expected is None and db.get_record_by_id(record_id) is None:
+            raise HttpError(404, f"No record {record_id}")
+        db.update_record(record_id, *clean, expected_version=expected)
+        record = db.get_record_by_id(record_id)
+        self.send_json(200, record_json(record), {"ETag": f'"{record.version}"'})
+
+    def delete_record(self, record_id):
+        db = self.server.db
+        if db.get_record_by_id(record_id) is None:
+            raise HttpError(404, f"No record {record_id}")
+        db.delete_record(record_id, expected_version=self.expected_version())
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def search(self):
+        query = self.query.get("q", "")
+        limit = self.int_param("limit", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        records = self.server.db.search(query, limit)
+        self.send_json(200, {"records": [record_json(record) for record in records]})
+
+    def stats(self):
+        self.send_json(200, self.server.db.stats())
+
+    def export(self):
+        # One JSON object per line, sent in chunks as the rows are read, so
+        # neither side holds the whole table
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        lines = []
+        for record in self.server.db.iter_records(batch_size=EXPORT_BATCH_SIZE):
+            lines.append(json.dumps(record_json(record)))
+            if len(lines) >= EXPORT_BATCH_SIZE:
+                self._write_chunk(lines)
+                lines = []
+        if lines:
+            self._write_chunk(lines)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, lines):
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve student records as JSON over HTTP")
+    parser.add_argument("--db", default="records.db", help="database file (default: records.db)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=WORKER_THREADS, help="request threads")
+    parser.add_argument("--quiet", action="store_true", help="don't log every request")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    db.start_checkpointer()
+    server = RecordService(db, (args.host, args.port), workers=args.workers, quiet=args.quiet)
+    print(f"Serving {args.db} on http://{args.host}:{server.server_address[1]}/records")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+SLOW_LOG_SIZE = 50
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+class Instrumentation:
+    # Opt-in counters for a Database: method and UI-span latency histograms,
+    # per-statement counts/time/rows, connection opens, and a log of slow
+    # statements with their EXPLAIN QUERY PLAN. Thread-safe; everything is
+    # kept in memory and can be dumped to JSON for manage_db.py report.
+    def __init__(self, slow_ms=50, path=None):
+        self.slow_ms = slow_ms
+        # Where Database.close() dumps the snapshot; None keeps it in memory only
+        self.path = path
+        self.started = time.time()
+        self.connections_opened = 0
+        self._timings = {}
+        self._queries = {}
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def record_timing(self, name, elapsed):
+        ms = elapsed * 1000
+        with self._lock:
+            stats = self._timings.get(name)
+            if stats is None:
+                stats = self._timings[name] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                               "buckets": [0] * (len(BUCKETS_MS) + 1)}
+            stats["count"] += 1
+            stats["total_ms"] += ms
+            stats["max_ms"] = max(stats["max_ms"], ms)
+            stats["buckets"][_bucket(ms)] += 1
+
+    def timed(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record_timing(name, time.perf_counter() - start)
+
+    @contextmanager
+    def span(self, name):
+        # Times a block of (usually UI) code under its own histogram
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_timing(name, time.perf_counter() - start)
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def record_query(self, sql, elapsed, rows=0, executions=1):
+        with self._lock:
+            stats = self._queries.get(sql)
+            if stats is None:
+                stats = self._queries[sql] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0}
+            stats["count"] += executions
+            stats["total_ms"] += elapsed * 1000
+            stats["max_ms"] = max(stats["max_ms"], elapsed * 1000)
+            stats["rows"] += rows
+
+    def record_slow(self, sql, params, elapsed, plan):
+        with self._lock:
+            self._slow.append({"sql": sql, "params": repr(params)[:200], "ms": elapsed * 1000,
+                               "plan": plan, "at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "uptime_s": time.time() - self.started,
+                "slow_ms": self.slow_ms,
+                "buckets_ms": list(BUCKETS_MS),
+                "connections_opened": self.connections_opened,
+                "timings": {name: dict(stats, buckets=list(stats["buckets"])) for name, stats in self._timings.items()},
+                "queries": {sql: dict(stats) for sql, stats in self._queries.items()},
+                "slow_queries": list(self._slow),
+            }
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.connections_opened = 0
+            self._timings = {}
+            self._queries = {}
+            self._slow.clear()
+
+
+def _bucket(ms):
+    for index, bound in enumerate(BUCKETS_MS):
+        if ms <= bound:
+            return index
+    return len(BUCKETS_MS)
+
+
+def normalize_sql(sql):
+    return WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def format_report(snapshot, top=15):
+    lines = [f"Instrumentation since {snapshot['started']} ({snapshot['uptime_s']:.0f} s), "
+             f"{snapshot['connections_opened']} connections opened"]
+    bounds = [f"<={b:g}" for b in snapshot["buckets_ms"]] + [f">{snapshot['buckets_ms'][-1]:g}"]
+
+    lines.append("\nLatency by method / span (ms):")
+    lines.append(f"  {'name':<44}{'count':>8}{'mean':>9}{'max':>9}  histogram " + " ".join(bounds))
+    timings = sorted(snapshot["timings"].items(), key=lambda item: -item[1]["total_ms"])
+    for name, stats in timings:
+        mean = stats["total_ms"] / stats["count"] if stats["count"] else 0.0
+        lines.append(f"  {name:<44}{stats['count']:>8}{mean:>9.3f}{stats['max_ms']:>9.3f}  "
+                     + " ".join(str(n) for n in stats["buckets"]))
+
+    lines.append(f"\nTop {top} statements by total time:")
+    queries = sorted(snapshot["queries"].items(), key=lambda item: -item[1]["total_ms"])[:top]
+    for sql, stats in queries:
+        lines.append(f"  {stats['total_ms']:10.1f} ms  {stats['count']:>7}x  {stats['rows']:>9} rows  {sql[:100]}")
+
+    lines.append(f"\nSlow statements (>{snapshot['slow_ms']:g} ms), most recent last:")
+    if not snapshot["slow_queries"]:
+        lines.append("  none")
+    for entry in snapshot["slow_queries"]:
+        lines.append(f"  {entry['at']}  {entry['ms']:.1f} ms  {entry['sql'][:100]}  params={entry['params']}")
+        for step in entry["plan"]:
+            lines.append(f"      {step}")
+    return "\n".join(lines)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # Times execute/executemany plus the fetches that follow, per statement
+    def execute(self, sql, parameters=()):
+        self._sql = normalize_sql(sql)
+        self._params = parameters
+        self._elapsed = 0.0
+        self._logged = False
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._finish(time.perf_counter() - start, 0)
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        self._sql = normalize_sql(sql)
+        # The first parameter set stands in for the batch in the slow log
+        self._params = seq_of_parameters[0] if seq_of_parameters else ()
+        self._elapsed = 0.0
+        self._logged = False
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._finish(time.perf_counter() - start, 0, executions=len(seq_of_parameters))
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._finish(time.perf_counter() - start, 1 if row is not None else 0, executions=0)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._finish(time.perf_counter() - start, len(rows), executions=0)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._finish(time.perf_counter() - start, len(rows), executions=0)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish(time.perf_counter() - start, 0, executions=0)
+            raise
+        self._finish(time.perf_counter() - start, 1, executions=0)
+        return row
+
+    def _finish(self, elapsed, rows, executions=1):
+        sql = getattr(self, "_sql", None)
+        if sql is None:
+            return
+        instrumentation = self.connection.instrumentation
+        instrumentation.record_query(sql, elapsed, rows, executions)
+        self._elapsed += elapsed
+        if not self._logged and self._elapsed * 1000 >= instrumentation.slow_ms:
+            self._logged = True
+            instrumentation.record_slow(sql, self._params, self._elapsed, self._explain())
+
+    def _explain(self):
+        if self._sql.split(" ", 1)[0].upper() not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+            return []
+        try:
+            # A plain cursor, so the plan lookup isn't itself instrumented
+            cursor = sqlite3.Cursor(self.connection)
+            cursor.execute("EXPLAIN QUERY PLAN " + self._sql, self._params)
+            return [row[-1] for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            return [f"(plan unavailable: {e})"]
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Connection factory handed to sqlite3.connect when instrumentation is on
+    instrumentation = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
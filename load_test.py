@@ -0,0 +1,178 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmark import build_dataset, summarize
+from http_service import WORKER_THREADS, RecordService
+
+DEFAULT_ROWS = 10000
+DEFAULT_CLIENTS = 8
+DEFAULT_DURATION_S = 10
+PAGE_SIZE = 50
+# Relative weights of the request mix; writes are off unless --writes is given
+MIX = {"get_record": 50, "list_page": 20, "list_not_modified": 15, "search": 15}
+WRITE_MIX = {"update_record": 10}
+
+
+class Client(threading.Thread):
+    # One keep-alive connection issuing the weighted mix until the deadline
+    def __init__(self, n, host, port, rows, mix, deadline, seed):
+        super().__init__(name=f"load-client-{n}")
+        self.n = n
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.rows = rows
+        self.names, self.weights = zip(*mix.items())
+        self.deadline = deadline
+        self.rng = random.Random(seed + n)
+        self.timings = {name: [] for name in self.names}
+        self.errors = {}
+        self.list_tag = None
+
+    def request(self, method, path, body=None, headers=None):
+        self.conn.request(method, path, body, headers or {})
+        response = self.conn.getresponse()
+        data = response.read()
+        return response.status, response.getheader("ETag"), data
+
+    def get_record(self):
+        status, _, _ = self.request("GET", f"/records/{self.rng.randint(1, self.rows)}")
+        return status == 200
+
+    def list_page(self):
+        after = self.rng.randint(0, max(self.rows - PAGE_SIZE, 0))
+        status, _, _ = self.request("GET", f"/records?limit={PAGE_SIZE}&after={after}")
+        return status == 200
+
+    def list_not_modified(self):
+        # A client revalidating the first page it already holds
+        status, tag, _ = self.request("GET", f"/records?limit={PAGE_SIZE}",
+                                      headers={"If-None-Match": self.list_tag} if self.list_tag else None)
+        self.list_tag = tag
+        return status in (200, 304)
+
+    def search(self):
+        status, _, _ = self.request("GET", f"/search?q=Student+{self.rng.randint(1, self.rows)}&limit=10")
+        return status == 200
+
+    def update_record(self):
+        rid = self.rng.randint(1, self.rows)
+        status, tag, data = self.request("GET", f"/records/{rid}")
+        if status != 200:
+            return False
+        record = json.loads(data)
+        record["address"] = f"Room {self.rng.randint(1, 999)}"
+        status, _, _ = self.request("PUT", f"/records/{rid}", json.dumps(record),
+                                    {"Content-Type": "application/json", "If-Match": tag})
+        # 412 means another client won the race, which is the expected outcome
+        return status in (200, 412)
+
+    def run(self):
+        try:
+            while time.perf_counter() < self.deadline:
+                name = self.rng.choices(self.names, self.weights)[0]
+                start = time.perf_counter()
+                try:
+                    ok = getattr(self, name)()
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                    self.conn.close()
+                if ok:
+                    self.timings[name].append(time.perf_counter() - start)
+                else:
+                    self.errors[name] = self.errors.get(name, 0) + 1
+        finally:
+            self.conn.close()
+
+
+def run_load(url, rows, clients, duration, mix, seed):
+    address = urlsplit(url)
+    deadline = time.perf_counter() + duration
+    threads = [Client(n, address.hostname, address.port, rows, mix, deadline, seed) for n in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for name in mix:
+        timings = [x for t in threads for x in t.timings[name]]
+        errors = sum(t.errors.get(name, 0) for t in threads)
+        if timings:
+            results[name] = dict(summarize(timings), requests_per_sec=len(timings) / elapsed, errors=errors)
+        else:
+            results[name] = {"samples": 0, "errors": errors}
+    total = sum(r["samples"] for r in results.values())
+    return {"elapsed_s": elapsed, "requests": total, "requests_per_sec": total / elapsed,
+            "errors": sum(r["errors"] for r in results.values()), "endpoints": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure requests/sec against the HTTP record service")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="records in the temporary database")
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENTS,
+                        help="concurrent keep-alive connections (each holds a server worker while active)")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_S, help="seconds to run")
+    parser.add_argument("--workers", type=int, default=WORKER_THREADS, help="server request threads")
+    parser.add_argument("--writes", action="store_true", help="mix in optimistic updates")
+    parser.add_argument("--url", help="load an already running service instead (its records must be ids 1..rows)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    mix = dict(MIX, **WRITE_MIX) if args.writes else dict(MIX)
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "rows": args.rows,
+            "clients": args.clients,
+            "workers": args.workers,
+            "writes": args.writes,
+        },
+    }
+
+    if args.url:
+        results.update(run_load(args.url, args.rows, args.clients, args.duration, mix, args.seed))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Served as in production, with the record cache on
+            db, _ = build_dataset(os.path.join(tmp, "load.db"), args.rows, cache_size=None)
+            server = RecordService(db, ("127.0.0.1", 0), workers=args.workers, quiet=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                url = f"http://127.0.0.1:{server.server_address[1]}"
+                results.update(run_load(url, args.rows, args.clients, args.duration, mix, args.seed))
+            finally:
+                server.shutdown()
+                server.server_close()
+                db.close()
+
+    print(f"{results['requests']} requests in {results['elapsed_s']:.1f}s from {args.clients} clients: "
+          f"{results['requests_per_sec']:.0f} requests/sec, {results['errors']} errors")
+    for name, stats in results["endpoints"].items():
+        if stats["samples"]:
+            print(f"  {name:<20} {stats['requests_per_sec']:8.0f}/s  p50 {stats['p50_ms']:7.2f} ms  "
+                  f"p95 {stats['p95_ms']:7.2f} ms  ({stats['errors']} errors)")
+        else:
+            print(f"  {name:<20} no successful requests ({stats['errors']} errors)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
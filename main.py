@@ -1,8 +1,12 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox
-from database import Database
-import re
+from database import ConflictError, Database, DuplicateRecordError
+from record import Record
+from db_worker import DbWorker
+from migrations import AGE_LABELS
+from validation import CONTACT_LENGTH, validate_record
+import time
 
 # Premium Theme Colors
 COLOR_BG_PRIMARY = "#f0f2f5"  # Slightly darker gray for background contrast
@@ -25,13 +29,25 @@ FONT_ENTRY = ("Helvetica", 11)
 FONT_CARD_DATA = ("Helvetica", 10)
 
 class RecordSystemApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, db_name="records.db"):
+        self._startup_started = time.perf_counter()
+        # Seconds from construction to "first_paint" and "interactive" (first records shown)
+        self.startup_times = {}
         super().__init__()
         self.title("RMS Mobile")
         # Standard mobile aspect ratio
         self.geometry("400x700")
         self.configure(bg=COLOR_BG_PRIMARY)
         
+        # Single shared database handle reused by every screen; all calls go
+        # through the worker thread so the window never waits on SQLite
+        self.db = Database.shared(db_name, bootstrap=False)
+        self.worker = DbWorker(self, self.db)
+        # Schema checks run as the worker's first job, ahead of any screen's queries
+        self.worker.submit(self.db.create_table)
+        self.db.start_checkpointer()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Main Layout: Header, Content, Footer
         self.grid_rowconfigure(1, weight=1)
         self.grid_columnconfigure(0, weight=1)
@@ -44,6 +60,11 @@ class RecordSystemApp(tk.Tk):
         self.lbl_header = tk.Label(self.header, text="Records", bg=COLOR_HEADER, fg=COLOR_NAV_TEXT, font=FONT_HEADER)
         self.lbl_header.pack(expand=True)
         
+        # Loading indicator, shown while database requests are in flight
+        self.lbl_status = tk.Label(self.header, text="", bg=COLOR_HEADER, fg="#a5b1c2", font=FONT_TAB)
+        self.lbl_status.place(relx=1.0, rely=0.5, x=-12, anchor="e")
+        self.worker.on_busy(lambda busy: self.lbl_status.config(text="Loading..." if busy else ""))
+        
         # --- Body (Content Area) ---
         self.container = tk.Frame(self, bg=COLOR_BG_PRIMARY)
         self.container.grid(row=1, column=0, sticky="nsew")
@@ -60,19 +81,25 @@ class RecordSystemApp(tk.Tk):
         # Nav Buttons in Footer
         self.footer.grid_columnconfigure(0, weight=1)
         self.footer.grid_columnconfigure(1, weight=1)
+        self.footer.grid_columnconfigure(2, weight=1)
         
         self.btn_view = self.create_nav_btn("View", 0, lambda: self.show_frame("ViewRecordsScreen"))
         self.btn_add = self.create_nav_btn("Add", 1, lambda: self.show_frame("AddRecordScreen"))
+        self.btn_stats = self.create_nav_btn("Stats", 2, lambda: self.show_frame("StatsScreen"))
         
+        # Screens are built the first time they are shown
+        self.frame_classes = {F.__name__: F for F in (ViewRecordsScreen, AddRecordScreen, StatsScreen)}
         self.frames = {}
-        for F in (ViewRecordsScreen, AddRecordScreen):
-            name = F.__name__
-            frame = F(parent=self.container, controller=self)
-            self.frames[name] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
+        self.current_frame = None
         
+        self.bind("<Expose>", self._on_first_expose, add="+")
         self.show_frame("ViewRecordsScreen")
 
+    def on_close(self):
+        self.worker.stop()
+        self.db.close()
+        self.destroy()
+
     def create_nav_btn(self, text, col, cmd):
         btn_frame = tk.Frame(self.footer, bg=COLOR_HEADER)
         btn_frame.grid(row=0, column=col, sticky="nsew")
@@ -84,16 +111,42 @@ class RecordSystemApp(tk.Tk):
         self.nav_buttons[text] = btn
         return btn
 
+    def get_frame(self, name):
+        frame = self.frames.get(name)
+        if frame is None:
+            frame = self.frame_classes[name](parent=self.container, controller=self)
+            frame.grid(row=0, column=0, sticky="nsew")
+            self.frames[name] = frame
+        return frame
+
+    def mark_startup(self, stage):
+        # Records the first time each startup stage is reached
+        if stage not in self.startup_times:
+            elapsed = time.perf_counter() - self._startup_started
+            self.startup_times[stage] = elapsed
+            if self.db.instrumentation is not None:
+                self.db.instrumentation.record_timing(f"startup.{stage}", elapsed)
+
+    def _on_first_expose(self, event):
+        self.mark_startup("first_paint")
+        self.unbind("<Expose>")
+
+    # Screen name -> (nav button, header title)
+    SCREENS = {
+        "ViewRecordsScreen": ("View", "Records"),
+        "AddRecordScreen": ("Add", "Add Record"),
+        "StatsScreen": ("Stats", "Statistics"),
+    }
+
     def show_frame(self, name):
-        frame = self.frames[name]
-        self.lbl_header.config(text="Add Record" if name == "AddRecordScreen" else "Records")
+        frame = self.get_frame(name)
+        self.current_frame = name
+        nav_text, title = self.SCREENS[name]
+        self.lbl_header.config(text=title)
         
         # Update Nav Styles
         for text, btn in self.nav_buttons.items():
-            if (text == "View" and name == "ViewRecordsScreen") or (text == "Add" and name == "AddRecordScreen"):
-                btn.config(fg=COLOR_NAV_ACTIVE)
-            else:
-                btn.config(fg=COLOR_NAV_TEXT)
+            btn.config(fg=COLOR_NAV_ACTIVE if text == nav_text else COLOR_NAV_TEXT)
         
         if hasattr(frame, 'on_show'):
             frame.on_show()
@@ -101,18 +154,148 @@ class RecordSystemApp(tk.Tk):
 
     def validate_contact(self, P):
         # P is the value if the change is allowed
-        if len(P) > 11:
+        if len(P) > CONTACT_LENGTH:
             return False
         if P == "" or P.isdigit():
             return True
         return False
 
+class RecordCard:
+    # A reusable card; the virtual list rebinds it to whichever record scrolls into its slot
+    def __init__(self, parent, screen):
+        self.rec = None
+        self.screen = screen
+        
+        # Card Container (Shadow Simulation Layer)
+        self.shadow_frame = tk.Frame(parent, bg=COLOR_CARD_SHADOW, pady=0, padx=0)
+        
+        # Main Card Body
+        self.card = card = tk.Frame(self.shadow_frame, bg=COLOR_CARD_BG, pady=18, padx=18, 
+                                    highlightthickness=1, highlightbackground=COLOR_BORDER)
+        card.pack(fill="x", pady=(0, 2), padx=(0, 0)) # Offset to show shadow
+        
+        # Content
+        self.title_lbl = tk.Label(card, text="", font=FONT_TITLE, bg=COLOR_CARD_BG, fg=COLOR_NAV_TEXT, anchor="w")
+        self.title_lbl.pack(fill="x")
+        
+        # Divider Line
+        divider = tk.Frame(card, bg=COLOR_BG_PRIMARY, height=1)
+        divider.pack(fill="x", pady=10)
+        
+        details_frame = tk.Frame(card, bg=COLOR_CARD_BG)
+        details_frame.pack(fill="x")
+        
+        def add_info(lbl):
+            row = tk.Frame(details_frame, bg=COLOR_CARD_BG)
+            row.pack(fill="x", pady=2)
+            tk.Label(row, text=lbl, font=("Helvetica", 8, "bold"), bg=COLOR_CARD_BG, fg="#a5b1c2", width=8, anchor="w").pack(side="left")
+            val = tk.Label(row, text="", font=FONT_CARD_DATA, bg=COLOR_CARD_BG, fg="#4b6584")
+            val.pack(side="left")
+            return val
+
+        self.age_lbl = add_info("AGE:")
+        self.phone_lbl = add_info("PHONE:")
+        self.email_lbl = add_info("EMAIL:")
+        self.addr_lbl = add_info("ADDR:")
+        
+        # Actions bar
+        actions = tk.Frame(card, bg=COLOR_CARD_BG)
+        actions.pack(fill="x", pady=(15, 0))
+        
+        self.edit_btn = tk.Button(actions, text="EDIT DETAILS", font=FONT_TAB, fg=COLOR_NAV_ACTIVE, bg="#f1f2f6", bd=0, 
+                                  activeforeground=COLOR_NAV_ACTIVE, cursor="hand2",
+                                  command=self._on_primary,
+                                  padx=10, pady=5)
+        self.edit_btn.pack(side="left", padx=(0, 10))
+        
+        self.del_btn = tk.Button(actions, text="DELETE", font=FONT_TAB, fg=COLOR_DANGER, bg="#fff5f5", bd=0, 
+                                 activeforeground=COLOR_DANGER, cursor="hand2",
+                                 command=lambda: self.rec and screen.delete_rec(self.rec),
+                                 padx=10, pady=5)
+        self.del_btn.pack(side="left")
+
+    def bind(self, rec):
+        self.rec = rec
+        self.title_lbl.config(text=rec.name.upper())
+        self.age_lbl.config(text=rec.age)
+        self.phone_lbl.config(text=rec.contact)
+        self.email_lbl.config(text=rec.email)
+        self.addr_lbl.config(text=rec.address)
+        self.show_selection()
+
+    def show_selection(self):
+        # In select mode the edit button toggles selection and delete is done in bulk
+        if self.screen.select_mode:
+            selected = self.rec is not None and self.rec.id in self.screen.selected
+            self.edit_btn.config(text="SELECTED" if selected else "SELECT")
+            self.card.config(highlightthickness=2 if selected else 1,
+                             highlightbackground=COLOR_ACCENT if selected else COLOR_BORDER)
+            self.del_btn.pack_forget()
+        else:
+            self.edit_btn.config(text="EDIT DETAILS")
+            self.card.config(highlightthickness=1, highlightbackground=COLOR_BORDER)
+            if not self.del_btn.winfo_manager():
+                self.del_btn.pack(side="left")
+
+    def _on_primary(self):
+        if not self.rec:
+            return
+        if self.screen.select_mode:
+            self.screen.toggle_selected(self.rec.id)
+        else:
+            self.screen.edit_rec(self.rec)
+
+    def place_at(self, y):
+        self.shadow_frame.place(x=8, y=y + 5, relwidth=1.0, width=-16)
+
+    def hide(self):
+        self.rec = None
+        self.shadow_frame.place_forget()
+
 class ViewRecordsScreen(tk.Frame):
+    PAGE_SIZE = 50
+    # Cards kept alive above/below the viewport so short scrolls don't rebind
+    OVERSCAN = 2
+    # Fetched pages kept in memory; the ones farthest from the viewport go first
+    MAX_PAGES = 20
+    SEARCH_LIMIT = 200
+    # Typing pause before the search query is sent
+    SEARCH_DELAY_MS = 250
+    # Pages fetched ahead of the viewport once it is filled, spaced by the delay
+    PREFETCH_PAGES = 4
+    PREFETCH_DELAY_MS = 50
+
     def __init__(self, parent, controller):
         super().__init__(parent, bg=COLOR_BG_PRIMARY)
         self.controller = controller
         
-        # List of Records (Using a Canvas + Frame for a smooth scrolling card list)
+        # Search bar; results come from the full-text index as the user types
+        search_bar = tk.Frame(self, bg=COLOR_BG_PRIMARY)
+        search_bar.pack(side="top", fill="x", padx=18, pady=(10, 0))
+        label_row = tk.Frame(search_bar, bg=COLOR_BG_PRIMARY)
+        label_row.pack(fill="x")
+        tk.Label(label_row, text="SEARCH", font=("Helvetica", 8, "bold"), bg=COLOR_BG_PRIMARY, fg="#a5b1c2").pack(side="left")
+        
+        # Multi-select mode: pick several cards, then delete them in one batch
+        self.select_mode = False
+        self.selected = set()
+        self.select_btn = tk.Button(label_row, text="SELECT", font=FONT_TAB, fg=COLOR_NAV_ACTIVE, bg=COLOR_BG_PRIMARY,
+                                    bd=0, activebackground=COLOR_BG_PRIMARY, cursor="hand2",
+                                    command=self.toggle_select_mode)
+        self.select_btn.pack(side="right")
+        self.bulk_del_btn = tk.Button(label_row, text="DELETE (0)", font=FONT_TAB, fg=COLOR_DANGER, bg=COLOR_BG_PRIMARY,
+                                      bd=0, activebackground=COLOR_BG_PRIMARY, cursor="hand2",
+                                      command=self.delete_selected)
+        self.search_var = tk.StringVar()
+        self.search_entry = tk.Entry(search_bar, textvariable=self.search_var, font=FONT_ENTRY, bg="#ffffff", bd=1,
+                                     relief="flat", highlightthickness=1, highlightbackground=COLOR_BORDER)
+        self.search_entry.pack(fill="x", ipady=6)
+        self.search_var.trace_add("write", lambda *args: self._schedule_search())
+        self.query = ""
+        self._search_after_id = None
+        
+        # List of Records (Using a Canvas + Frame for a smooth scrolling card list).
+        # Only the cards in view exist; they are recycled as the list scrolls.
         self.canvas = tk.Canvas(self, bg=COLOR_BG_PRIMARY, highlightthickness=0)
         self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
         self.scrollable_frame = tk.Frame(self.canvas, bg=COLOR_BG_PRIMARY)
@@ -127,87 +310,328 @@ class ViewRecordsScreen(tk.Frame):
         # Fix width of scrollable frame on resize
         self.canvas.bind('<Configure>', self._on_canvas_configure)
         
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.configure(yscrollcommand=self._on_scroll)
         
         self.canvas.pack(side="left", fill="both", expand=True, padx=10, pady=10)
         self.scrollbar.pack(side="right", fill="y")
         
+        self.empty_lbl = tk.Label(self.scrollable_frame, text="No records yet", bg=COLOR_BG_PRIMARY, font=FONT_LABEL)
+        
+        self.total = 0
+        self.pages = {}
+        self.row_height = None
+        self.visible = {}
+        self.free_cards = []
+        self._render_pending = False
+        self.loaded = False
+        self.count_pending = False
+        # Bumped whenever cached pages are discarded so late replies are ignored
+        self.generation = 0
+        self.loading_pages = set()
+        self._load_started = None
+        self._prefetch_id = None
+        
+        # Patch the list in place when records change instead of reloading it
+        controller.worker.subscribe(self.on_records_changed)
+        
     def _on_canvas_configure(self, event):
         self.canvas.itemconfig(self.window_id, width=event.width)
+        self._schedule_render()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._schedule_render()
 
     def on_show(self):
-        self.load_records()
+        if not self.loaded:
+            self.load_records()
 
     def load_records(self):
-        # Clear frame
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-            
-        try:
-            records = Database().get_records()
-            if not records:
-                tk.Label(self.scrollable_frame, text="No records yet", bg=COLOR_BG_PRIMARY, font=FONT_LABEL).pack(pady=50)
-                return
-                
-            for rec in records:
-                # rec: (id, name, age, address, contact, email)
-                self.create_card(rec)
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-
-    def create_card(self, rec):
-        # Card Container (Shadow Simulation Layer)
-        shadow_frame = tk.Frame(self.scrollable_frame, bg=COLOR_CARD_SHADOW, pady=0, padx=0)
-        shadow_frame.pack(fill="x", pady=(5, 12), padx=8)
-        
-        # Main Card Body
-        card = tk.Frame(shadow_frame, bg=COLOR_CARD_BG, pady=18, padx=18, 
-                        highlightthickness=1, highlightbackground=COLOR_BORDER)
-        card.pack(fill="x", pady=(0, 2), padx=(0, 0)) # Offset to show shadow
-        
-        # Content
-        title_lbl = tk.Label(card, text=rec[1].upper(), font=FONT_TITLE, bg=COLOR_CARD_BG, fg=COLOR_NAV_TEXT, anchor="w")
-        title_lbl.pack(fill="x")
-        
-        # Divider Line
-        divider = tk.Frame(card, bg=COLOR_BG_PRIMARY, height=1)
-        divider.pack(fill="x", pady=10)
-        
-        details_frame = tk.Frame(card, bg=COLOR_CARD_BG)
-        details_frame.pack(fill="x")
-        
-        def add_info(lbl, val):
-            row = tk.Frame(details_frame, bg=COLOR_CARD_BG)
-            row.pack(fill="x", pady=2)
-            tk.Label(row, text=lbl, font=("Helvetica", 8, "bold"), bg=COLOR_CARD_BG, fg="#a5b1c2", width=8, anchor="w").pack(side="left")
-            tk.Label(row, text=val, font=FONT_CARD_DATA, bg=COLOR_CARD_BG, fg="#4b6584").pack(side="left")
+        self._load_started = time.perf_counter()
+        self.loaded = True
+        self.count_pending = True
+        self.generation += 1
+        generation = self.generation
+        self.controller.worker.submit(self.controller.db.count_records,
+                                      on_done=lambda total: self._on_count(total, generation))
+        # Ask for the first page right behind the count instead of after it returns
+        self.loading_pages = set()
+        self._request_page(0)
+
+    def _on_count(self, total, generation):
+        if generation != self.generation:
+            return
+        self.count_pending = False
+        self._reset_list(total, {}, loading={0} if total else ())
+
+    def _reset_list(self, total, pages, loading=()):
+        self.total = total
+        self.pages = pages
+        self.loading_pages = set(loading)
+        for card in self.visible.values():
+            card.hide()
+            self.free_cards.append(card)
+        self.visible = {}
+        
+        if not self.total:
+            self.empty_lbl.config(text="No matching records" if self.query else "No records yet")
+            self.empty_lbl.place(relx=0.5, y=50, anchor="n")
+            self.controller.mark_startup("interactive")
+        else:
+            self.empty_lbl.place_forget()
+        self._resize()
+        self._render()
+
+    def _schedule_search(self):
+        # Debounce: only query once typing pauses
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(self.SEARCH_DELAY_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_after_id = None
+        self.query = self.search_var.get().strip()
+        if not self.query:
+            self.load_records()
+            return
+        self.loaded = True
+        self.count_pending = False
+        self.generation += 1
+        generation = self.generation
+        self.controller.worker.submit(self.controller.db.search, self.query, self.SEARCH_LIMIT,
+                                      on_done=lambda rows: self._on_search_results(rows, generation))
+
+    def _on_search_results(self, rows, generation):
+        if generation != self.generation:
+            return
+        # The ranked matches become the pages of the virtual list; nothing else is fetched
+        pages = {i // self.PAGE_SIZE: rows[i:i + self.PAGE_SIZE] for i in range(0, len(rows), self.PAGE_SIZE)}
+        self.canvas.yview_moveto(0)
+        self._reset_list(len(rows), pages)
 
-        add_info("AGE:", rec[2])
-        add_info("PHONE:", rec[4])
-        add_info("EMAIL:", rec[5])
-        add_info("ADDR:", rec[3])
-        
-        # Actions bar
-        actions = tk.Frame(card, bg=COLOR_CARD_BG)
-        actions.pack(fill="x", pady=(15, 0))
-        
-        edit_btn = tk.Button(actions, text="EDIT DETAILS", font=FONT_TAB, fg=COLOR_NAV_ACTIVE, bg="#f1f2f6", bd=0, 
-                             activeforeground=COLOR_NAV_ACTIVE, cursor="hand2", command=lambda r=rec: self.edit_rec(r),
-                             padx=10, pady=5)
-        edit_btn.pack(side="left", padx=(0, 10))
+    def on_records_changed(self, event, ids):
+        if not self.loaded:
+            return
+        if event == "deleted" and self.selected:
+            self.selected.difference_update(ids)
+            self._update_selection()
+        if self.query:
+            # Any change may alter the matches or their ranking
+            self._run_search()
+            return
+        if event == "updated":
+            self.controller.worker.submit(self.controller.db.get_records_by_ids, ids, on_done=self._on_updated)
+            return
+        if self.count_pending:
+            # The total in flight may or may not include this change; ask again
+            self.load_records()
+            return
         
-        del_btn = tk.Button(actions, text="DELETE", font=FONT_TAB, fg=COLOR_DANGER, bg="#fff5f5", bd=0, 
-                            activeforeground=COLOR_DANGER, cursor="hand2", command=lambda r=rec: self.delete_rec(r[0]),
-                            padx=10, pady=5)
-        del_btn.pack(side="left")
+        # Rows are ordered by id, so an insert/delete only shifts rows after it.
+        # Drop the pages from that point on; _render refetches just what's visible.
+        self.total += len(ids) if event == "inserted" else -len(ids)
+        first_changed = min(ids)
+        for page_index in [i for i, page in self.pages.items()
+                           if len(page) < self.PAGE_SIZE or page[-1].id >= first_changed]:
+            del self.pages[page_index]
+        self.generation += 1
+        self.loading_pages = set()
+        if self.total:
+            self.empty_lbl.place_forget()
+        else:
+            self.empty_lbl.place(relx=0.5, y=50, anchor="n")
+        self._resize()
+        self._schedule_render()
+
+    def _on_updated(self, records):
+        fresh = {rec.id: rec for rec in records}
+        for page in self.pages.values():
+            for i, rec in enumerate(page):
+                if rec.id in fresh:
+                    page[i] = fresh[rec.id]
+        for card in self.visible.values():
+            if card.rec and card.rec.id in fresh:
+                card.bind(fresh[card.rec.id])
+
+    def _resize(self):
+        if self.row_height is None and self.total:
+            # Measure one card to size the virtual list
+            card = self._take_card()
+            card.bind(Record(0, "", "", "", "", ""))
+            card.place_at(0)
+            self.update_idletasks()
+            self.row_height = card.shadow_frame.winfo_reqheight() + 17
+            card.hide()
+            self.free_cards.append(card)
+        # Leave room for the empty-state label when there is nothing to show
+        height = self.total * self.row_height if self.total else 150
+        self.canvas.itemconfig(self.window_id, height=height)
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), height))
+
+    def _schedule_render(self):
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._render)
+
+    def _render(self):
+        self._render_pending = False
+        if not self.total or not self.row_height or self.canvas.winfo_height() <= 1:
+            # Nothing to show yet, or the canvas isn't mapped; <Configure> renders later
+            return
+        top, bottom = self.canvas.yview()
+        height = self.total * self.row_height
+        first = max(int(top * height) // self.row_height - self.OVERSCAN, 0)
+        last = min(int(bottom * height) // self.row_height + self.OVERSCAN, self.total - 1)
+        
+        for index in [i for i in self.visible if i < first or i > last]:
+            card = self.visible.pop(index)
+            card.hide()
+            self.free_cards.append(card)
+        
+        missing = False
+        with self.controller.db.span("ViewRecordsScreen._render"):
+            for index in range(first, last + 1):
+                rec = self._get_row(index)
+                if rec is None:
+                    missing = True
+                    continue
+                card = self.visible.get(index)
+                if card is None:
+                    card = self._take_card()
+                    self.visible[index] = card
+                    card.place_at(index * self.row_height)
+                if card.rec != rec:
+                    card.bind(rec)
+        if not missing and self._load_started is not None:
+            # Click-to-filled-screen time; compare with the Database.* and Tk * timings
+            instrumentation = self.controller.db.instrumentation
+            if instrumentation is not None:
+                instrumentation.record_timing("ViewRecordsScreen.load_records (first screen)",
+                                              time.perf_counter() - self._load_started)
+            self._load_started = None
+            self.controller.mark_startup("interactive")
+        if not missing:
+            self._schedule_prefetch()
+
+    def _schedule_prefetch(self):
+        if self._prefetch_id is None:
+            self._prefetch_id = self.after(self.PREFETCH_DELAY_MS, self._prefetch)
+
+    def _prefetch(self):
+        # Streams in the pages just below the viewport, one per idle tick, so
+        # scrolling on finds them loaded; each arrival re-renders and schedules the next
+        self._prefetch_id = None
+        if self.query or not self.total:
+            return
+        last_visible = int(self.canvas.yview()[1] * self.total)
+        first_page = last_visible // self.PAGE_SIZE + 1
+        for page_index in range(first_page, first_page + self.PREFETCH_PAGES):
+            if page_index * self.PAGE_SIZE >= self.total:
+                return
+            if page_index not in self.pages:
+                if page_index - 1 in self.pages:
+                    self._request_page(page_index)
+                return
 
-    def delete_rec(self, rid):
+    def _take_card(self):
+        if self.free_cards:
+            return self.free_cards.pop()
+        return RecordCard(self.scrollable_frame, self)
+
+    def _get_row(self, index):
+        # Returns None (and requests the page) when the row isn't loaded yet
+        page_index = index // self.PAGE_SIZE
+        page = self.pages.get(page_index)
+        if page is None:
+            self._request_page(page_index)
+            return None
+        offset = index % self.PAGE_SIZE
+        return page[offset] if offset < len(page) else None
+
+    def _request_page(self, page_index):
+        if page_index in self.loading_pages:
+            return
+        self.loading_pages.add(page_index)
+        previous = self.pages.get(page_index - 1)
+        after_id = previous[-1].id if previous else None
+        generation = self.generation
+        self.controller.worker.submit(
+            self._fetch_page, self.controller.db, page_index, self.PAGE_SIZE, after_id,
+            on_done=lambda page: self._on_page(page_index, page, generation),
+            on_error=lambda e: self._on_page_error(page_index, e, generation))
+
+    @staticmethod
+    def _fetch_page(db, page_index, page_size, after_id):
+        # Runs on the worker thread
+        if page_index and after_id is None:
+            # Jumped past unloaded pages (e.g. dragged the scrollbar)
+            after_id = db.id_at_offset(page_index * page_size - 1)
+        return db.get_records_page(after_id=after_id, limit=page_size)
+
+    def _on_page(self, page_index, page, generation):
+        if generation != self.generation:
+            return
+        self.loading_pages.discard(page_index)
+        self.pages[page_index] = page
+        if len(self.pages) > self.MAX_PAGES:
+            farthest = max(self.pages, key=lambda i: abs(i - page_index))
+            del self.pages[farthest]
+        self._schedule_render()
+
+    def _on_page_error(self, page_index, error, generation):
+        if generation == self.generation:
+            self.loading_pages.discard(page_index)
+        messagebox.showerror("Error", str(error))
+
+    def delete_rec(self, rec):
         if messagebox.askyesno("Confirm", "Delete this record?"):
-            Database().delete_record(rid)
-            self.load_records()
+            self._delete(rec)
+
+    def _delete(self, rec):
+        # Only deletes the version on screen; a newer one is shown before asking again
+        self.controller.worker.submit(self.controller.db.delete_record, rec.id, expected_version=rec.version,
+                                      on_error=self._on_delete_error)
+
+    def _on_delete_error(self, e):
+        if isinstance(e, ConflictError):
+            if messagebox.askyesno("Record Changed",
+                                   f"{e}\n\nIt now reads:\n{e.current.name}, {e.current.email}\n\nDelete it anyway?"):
+                self._delete(e.current)
+        else:
+            messagebox.showerror("Error", str(e))
+
+    def toggle_select_mode(self):
+        self.select_mode = not self.select_mode
+        self.selected = set()
+        self.select_btn.config(text="CANCEL" if self.select_mode else "SELECT")
+        if self.select_mode:
+            self.bulk_del_btn.pack(side="right", padx=(0, 12))
+        else:
+            self.bulk_del_btn.pack_forget()
+        self._update_selection()
+
+    def toggle_selected(self, rid):
+        if rid in self.selected:
+            self.selected.discard(rid)
+        else:
+            self.selected.add(rid)
+        self._update_selection()
+
+    def _update_selection(self):
+        self.bulk_del_btn.config(text=f"DELETE ({len(self.selected)})")
+        for card in self.visible.values():
+            card.show_selection()
+
+    def delete_selected(self):
+        if not self.selected:
+            return
+        if messagebox.askyesno("Confirm", f"Delete {len(self.selected)} records?"):
+            # One transaction; the list is patched once from the single "deleted" event
+            self.controller.worker.submit(self.controller.db.delete_records, sorted(self.selected),
+                                          on_done=lambda deleted: self.select_mode and self.toggle_select_mode())
 
     def edit_rec(self, rec):
-        EditSheet(self, rec, self.load_records)
+        EditSheet(self, rec)
 
 class AddRecordScreen(tk.Frame):
     def __init__(self, parent, controller):
@@ -247,61 +671,157 @@ class AddRecordScreen(tk.Frame):
         self.btn_submit.pack(fill="x", pady=(30, 10))
 
     def save(self):
-        data = {k: v.get().strip() for k, v in self.entries.items()}
-        name = data["Name"]
-        age = data["Age"]
-        address = data["Address"]
-        contact = data["Contact"]
-        email = data["Email"]
-
-        if not all(data.values()):
-            messagebox.showerror("Validation", "Please fill all fields")
-            return
-        
-        # Validations
-        if not age.isdigit() or int(age) <= 0:
-            messagebox.showerror("Validation", "Age must be a positive number")
-            return
-
-        if not contact.isdigit():
-            messagebox.showerror("Validation", "Contact must contain only numbers (no letters)")
-            return
-
-        if len(contact) != 11:
-            messagebox.showerror("Validation", "Contact number must be exactly 11 digits")
-            return
-
-        if "@" not in email:
-            messagebox.showerror("Validation", "Invalid Email: Must contain '@'")
-            return
-        
-        # Basic Email Regex for better assurance
-        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-            messagebox.showerror("Validation", "Invalid Email format (e.g. user@example.com)")
+        data = {k: v.get() for k, v in self.entries.items()}
+        clean, errors = validate_record(data["Name"], data["Age"], data["Address"], data["Contact"], data["Email"])
+        if errors:
+            messagebox.showerror("Validation", "\n".join(errors))
             return
             
-        try:
-            db = Database()
-            # Check for duplicates (Name or Email)
-            if not db.verify_not_exists(name, email):
-                messagebox.showerror("Duplicate", "A record with this Name or Email already exists.")
-                return
-
-            db.add_record(name, int(age), address, contact, email)
-            self.clear()
-            self.controller.show_frame("ViewRecordsScreen")
-        except Exception as e:
+        # Duplicates (Name or Email) are rejected by the unique indexes
+        self.btn_submit.config(state="disabled")
+        self.controller.worker.submit(self.controller.db.add_record, *clean,
+                                      on_done=self._on_saved, on_error=self._on_save_error)
+
+    def _on_saved(self, record_id):
+        self.btn_submit.config(state="normal")
+        self.clear()
+        self.controller.show_frame("ViewRecordsScreen")
+
+    def _on_save_error(self, e):
+        self.btn_submit.config(state="normal")
+        if isinstance(e, DuplicateRecordError):
+            messagebox.showerror("Duplicate", "A record with this Name or Email already exists.")
+        else:
             messagebox.showerror("Error", str(e))
 
     def clear(self):
         for e in self.entries.values():
             e.delete(0, tk.END)
 
+class StatsScreen(tk.Frame):
+    # Totals and histograms from db.stats(), which reads a handful of
+    # trigger-maintained counters, so it is cheap to re-read after every
+    # change; only the labels and bars whose numbers moved are touched
+    REFRESH_DELAY_MS = 300
+    TOP_DOMAINS = 8
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, bg=COLOR_BG_PRIMARY)
+        self.controller = controller
+        # What the widgets currently show, to skip the ones that haven't changed
+        self.shown = {"total": None, "domains": None, "by_age": [], "by_domain": []}
+        self.stale = True
+        self.refreshing = False
+        self._refresh_after_id = None
+
+        body = tk.Frame(self, bg=COLOR_BG_PRIMARY, padx=20, pady=15)
+        body.pack(fill="both", expand=True)
+
+        total_card = self._card(body, "TOTAL RECORDS")
+        self.total_lbl = tk.Label(total_card, text="-", font=("Helvetica", 28, "bold"), bg=COLOR_CARD_BG,
+                                  fg=COLOR_ACCENT)
+        self.total_lbl.pack(anchor="w")
+        self.domains_lbl = tk.Label(total_card, text="", font=FONT_CARD_DATA, bg=COLOR_CARD_BG, fg=COLOR_NAV_TEXT)
+        self.domains_lbl.pack(anchor="w")
+
+        # Bars are built once; a refresh only changes their text and widths
+        self.age_bars = [self._bar(self._card_body(body, "BY AGE")) for _ in AGE_LABELS]
+        domain_card = self._card_body(body, "TOP EMAIL DOMAINS")
+        self.domain_bars = [self._bar(domain_card) for _ in range(self.TOP_DOMAINS)]
+
+        controller.worker.subscribe(self.on_records_changed)
+
+    def _card(self, parent, title):
+        shadow = tk.Frame(parent, bg=COLOR_CARD_SHADOW)
+        shadow.pack(fill="x", pady=(0, 12))
+        card = tk.Frame(shadow, bg=COLOR_CARD_BG, padx=15, pady=10, highlightthickness=1,
+                        highlightbackground=COLOR_BORDER)
+        card.pack(fill="x", pady=(0, 3))
+        tk.Label(card, text=title, font=FONT_LABEL, bg=COLOR_CARD_BG, fg="#a5b1c2").pack(anchor="w", pady=(0, 4))
+        return card
+
+    def _card_body(self, parent, title):
+        # A card whose rows are laid out in a grid below the title
+        card = self._card(parent, title)
+        rows = tk.Frame(card, bg=COLOR_CARD_BG)
+        rows.pack(fill="x")
+        rows.grid_columnconfigure(1, weight=1)
+        return rows
+
+    def _bar(self, parent):
+        row = parent.grid_size()[1]
+        name = tk.Label(parent, text="", font=FONT_CARD_DATA, bg=COLOR_CARD_BG, fg=COLOR_NAV_TEXT, width=14, anchor="w")
+        name.grid(row=row, column=0, sticky="w", pady=2)
+        track = tk.Frame(parent, bg=COLOR_BG_PRIMARY, height=10)
+        track.grid(row=row, column=1, sticky="ew", padx=8)
+        fill = tk.Frame(track, bg=COLOR_ACCENT)
+        fill.place(relx=0, rely=0, relheight=1, relwidth=0)
+        count = tk.Label(parent, text="", font=FONT_CARD_DATA, bg=COLOR_CARD_BG, fg=COLOR_NAV_TEXT, width=7, anchor="e")
+        count.grid(row=row, column=2, sticky="e")
+        return name, fill, count
+
+    def on_show(self):
+        if self.stale:
+            self.refresh()
+
+    def on_records_changed(self, event, ids):
+        self.stale = True
+        if self.controller.current_frame != "StatsScreen":
+            return  # Refreshed when next shown
+        # Batch bursts of changes (e.g. an import) into one read
+        if self._refresh_after_id is not None:
+            self.after_cancel(self._refresh_after_id)
+        self._refresh_after_id = self.after(self.REFRESH_DELAY_MS, self.refresh)
+
+    def refresh(self):
+        self._refresh_after_id = None
+        if self.refreshing:
+            return
+        self.refreshing = True
+        self.stale = False
+        self.controller.worker.submit(self.controller.db.stats, self.TOP_DOMAINS,
+                                      on_done=self._on_stats, on_error=self._on_stats_error)
+
+    def _on_stats_error(self, e):
+        self.refreshing = False
+        messagebox.showerror("Error", f"Failed to load statistics: {e}")
+
+    def _on_stats(self, stats):
+        self.refreshing = False
+        if self.stale:
+            # Changed again while this read was in flight
+            self.refresh()
+        shown = {"total": stats["total"], "domains": stats["domains"], "by_age": stats["by_age"],
+                 "by_domain": [(domain or "(none)", count) for domain, count in stats["by_domain"]]}
+        if shown["total"] != self.shown["total"]:
+            self.total_lbl.config(text=f"{shown['total']:,}")
+        if shown["domains"] != self.shown["domains"]:
+            self.domains_lbl.config(text=f"across {shown['domains']:,} email domains")
+        self._update_bars(self.age_bars, shown["by_age"], self.shown["by_age"])
+        self._update_bars(self.domain_bars, shown["by_domain"], self.shown["by_domain"])
+        self.shown = shown
+
+    def _update_bars(self, bars, values, previous):
+        # Widths are relative to the largest count, so a new maximum redraws every bar
+        peak = max([count for _, count in values] + [1])
+        rescaled = peak != max([count for _, count in previous] + [1])
+        for i, (name, fill, count) in enumerate(bars):
+            value = values[i] if i < len(values) else ("", 0)
+            if not rescaled and i < len(previous) and previous[i] == value:
+                continue
+            name.config(text=value[0])
+            count.config(text=f"{value[1]:,}" if value[0] else "")
+            fill.place_configure(relwidth=value[1] / peak)
+
 class EditSheet(tk.Toplevel):
-    def __init__(self, parent, rec, callback):
+    def __init__(self, parent, rec, callback=None):
         super().__init__(parent)
         self.callback = callback
-        self.rid = rec[0]
+        self.db = parent.controller.db
+        self.worker = parent.controller.worker
+        self.rid = rec.id
+        # Row version the form was filled from; saving fails if it has moved on
+        self.version = rec.version
         self.title("Update Entry")
         self.geometry("400x600")
         self.configure(bg=COLOR_BG_PRIMARY)
@@ -313,7 +833,7 @@ class EditSheet(tk.Toplevel):
         
         self.entries = {}
         fields = ["Name", "Age", "Address", "Contact", "Email"]
-        current = [rec[1], rec[2], rec[3], rec[4], rec[5]]
+        current = [rec.name, rec.age, rec.address, rec.contact, rec.email]
         
         vcmd = (self.register(parent.master.master.validate_contact), '%P')
         for i, field in enumerate(fields):
@@ -333,45 +853,44 @@ class EditSheet(tk.Toplevel):
                   font=FONT_TITLE, bd=0, cursor="hand2", command=self.save, pady=12).pack(fill="x", pady=30)
 
     def save(self):
-        data = {k: v.get().strip() for k, v in self.entries.items()}
-        name = data["Name"]
-        age = data["Age"]
-        address = data["Address"]
-        contact = data["Contact"]
-        email = data["Email"]
-
-        if not all(data.values()):
-            messagebox.showerror("Error", "Required fields empty.")
-            return
-
-        if not age.isdigit() or int(age) <= 0:
-            messagebox.showerror("Validation", "Age must be a positive number")
-            return
-
-        if not contact.isdigit():
-            messagebox.showerror("Validation", "Contact must contain only numbers (no letters)")
+        data = {k: v.get() for k, v in self.entries.items()}
+        clean, errors = validate_record(data["Name"], data["Age"], data["Address"], data["Contact"], data["Email"])
+        if errors:
+            messagebox.showerror("Validation", "\n".join(errors), parent=self)
             return
 
-        if len(contact) != 11:
-            messagebox.showerror("Validation", "Contact number must be exactly 11 digits")
+        # Duplicates against other records are rejected by the unique indexes
+        self.worker.submit(self.db.update_record, self.rid, *clean, expected_version=self.version,
+                           on_done=self._on_saved, on_error=self._on_save_error)
+
+    def _on_saved(self, result):
+        if self.callback:
+            self.callback()
+        self.destroy()
+
+    def _on_save_error(self, e):
+        if isinstance(e, DuplicateRecordError):
+            messagebox.showerror("Duplicate", "Another record with this Name or Email already exists.", parent=self)
+        elif isinstance(e, ConflictError):
+            self._on_conflict(e)
+        else:
+            messagebox.showerror("Error", str(e), parent=self)
+
+    def _on_conflict(self, e):
+        if e.current is None:
+            messagebox.showerror("Record Deleted", str(e), parent=self)
+            self.destroy()
             return
-
-        if "@" not in email:
-            messagebox.showerror("Validation", "Invalid Email: Must contain '@'")
-            return
-
-        try:
-             db = Database()
-             # Check for duplicates excluding current record
-             if not db.verify_not_exists(name, email, exclude_id=self.rid):
-                 messagebox.showerror("Duplicate", "Another record with this Name or Email already exists.")
-                 return
-
-             db.update_record(self.rid, name, int(age), address, contact, email)
-             self.callback()
-             self.destroy()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        # Yes reloads the other user's values; No keeps these edits, and the
+        # next save overwrites theirs
+        reload = messagebox.askyesno("Record Changed", f"{e}\n\nLoad the latest values? "
+                                     "(No keeps your edits; saving again will replace theirs.)", parent=self)
+        self.version = e.current.version
+        if reload:
+            latest = [e.current.name, e.current.age, e.current.address, e.current.contact, e.current.email]
+            for field, value in zip(["Name", "Age", "Address", "Contact", "Email"], latest):
+                self.entries[field].delete(0, "end")
+                self.entries[field].insert(0, str(value))
 
 if __name__ == "__main__":
     app = RecordSystemApp()
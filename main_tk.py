@@ -1,16 +1,30 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-from database import Database
-import re
+from database import ConflictError, Database, DuplicateRecordError
+from db_worker import DbWorker
+from validation import validate_changes, validate_record
+import time
 
 class RecordSystemApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, db_name="records.db"):
+        self._startup_started = time.perf_counter()
+        # Seconds from construction to "first_paint" and "interactive" (schema ready)
+        self.startup_times = {}
         super().__init__()
         self.title("Record Management System")
         self.geometry("600x500")
         self.configure(bg="#f0f0f0")
         
+        # Single shared database handle reused by every frame; all calls go
+        # through the worker thread so the window never waits on SQLite
+        self.db = Database.shared(db_name, bootstrap=False)
+        self.worker = DbWorker(self, self.db)
+        # Schema checks run as the worker's first job, ahead of any frame's queries
+        self.worker.submit(self.db.create_table, on_done=lambda result: self.mark_startup("interactive"))
+        self.db.start_checkpointer()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Style Configuration
         style = ttk.Style(self)
         style.theme_use('clam') # Usually better cross-platform look than default
@@ -20,20 +34,48 @@ class RecordSystemApp(tk.Tk):
         style.configure("Treeview", font=("Arial", 10), rowheight=25)
         style.configure("Treeview.Heading", font=("Arial", 11, "bold"))
         
+        # Loading indicator, shown while database requests are in flight
+        self.status = ttk.Label(self, text="", anchor="e", font=("Arial", 9))
+        self.status.pack(side="bottom", fill="x", padx=10)
+        self.worker.on_busy(lambda busy: self.status.config(text="Loading..." if busy else ""))
+        
         self.container = tk.Frame(self, bg="#f0f0f0")
         self.container.pack(fill="both", expand=True)
         
+        # Frames are built the first time they are shown
+        self.frame_classes = {F.__name__: F for F in (MainMenu, AddRecordFrame, ViewRecordsFrame)}
         self.frames = {}
-        for F in (MainMenu, AddRecordFrame, ViewRecordsFrame):
-            frame_name = F.__name__
-            frame = F(parent=self.container, controller=self)
-            self.frames[frame_name] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
         
+        self.bind("<Expose>", self._on_first_expose, add="+")
         self.show_frame("MainMenu")
     
+    def on_close(self):
+        self.worker.stop()
+        self.db.close()
+        self.destroy()
+
+    def get_frame(self, frame_name):
+        frame = self.frames.get(frame_name)
+        if frame is None:
+            frame = self.frame_classes[frame_name](parent=self.container, controller=self)
+            frame.grid(row=0, column=0, sticky="nsew")
+            self.frames[frame_name] = frame
+        return frame
+
+    def mark_startup(self, stage):
+        # Records the first time each startup stage is reached
+        if stage not in self.startup_times:
+            elapsed = time.perf_counter() - self._startup_started
+            self.startup_times[stage] = elapsed
+            if self.db.instrumentation is not None:
+                self.db.instrumentation.record_timing(f"startup.{stage}", elapsed)
+
+    def _on_first_expose(self, event):
+        self.mark_startup("first_paint")
+        self.unbind("<Expose>")
+
     def show_frame(self, frame_name):
-        frame = self.frames[frame_name]
+        frame = self.get_frame(frame_name)
         if hasattr(frame, 'on_show'):
             frame.on_show()
         frame.tkraise()
@@ -83,37 +125,26 @@ class AddRecordFrame(tk.Frame):
         ttk.Button(btn_frame, text="Cancel", command=lambda: controller.show_frame("MainMenu")).pack(side="left", padx=10)
     
     def save_record(self):
-        name = self.entries["Name"].get().strip()
-        age = self.entries["Age"].get().strip()
-        address = self.entries["Address"].get().strip()
-        contact = self.entries["Contact"].get().strip()
-        email = self.entries["Email"].get().strip()
-        
-        # Validation
-        if not all([name, age, address, contact, email]):
-            messagebox.showerror("Error", "All fields are required!")
+        data = {text: entry.get() for text, entry in self.entries.items()}
+        
+        # Validation (shared with the card UI and the CSV import)
+        clean, errors = validate_record(data["Name"], data["Age"], data["Address"], data["Contact"], data["Email"])
+        if errors:
+            messagebox.showerror("Error", "\n".join(errors))
             return
             
-        if not age.isdigit() or int(age) <= 0:
-            messagebox.showerror("Error", "Age must be a positive number.")
-            return
+        self.controller.worker.submit(self.controller.db.add_record, *clean,
+                                      on_done=self._on_saved, on_error=self._on_save_error)
 
-        if not contact.isdigit():
-             messagebox.showerror("Error", "Contact must contain only numbers.")
-             return
+    def _on_saved(self, record_id):
+        messagebox.showinfo("Success", "Record Added Successfully!")
+        self.clear_inputs()
+        self.controller.show_frame("ViewRecordsFrame")
 
-        email_regex = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_regex, email):
-            messagebox.showerror("Error", "Invalid Email Address.")
-            return
-            
-        try:
-            db = Database()
-            db.add_record(name, int(age), address, contact, email)
-            messagebox.showinfo("Success", "Record Added Successfully!")
-            self.clear_inputs()
-            self.controller.show_frame("ViewRecordsFrame")
-        except Exception as e:
+    def _on_save_error(self, e):
+        if isinstance(e, DuplicateRecordError):
+            messagebox.showerror("Duplicate", "A record with this Name or Email already exists.")
+        else:
             messagebox.showerror("Database Error", str(e))
             
     def clear_inputs(self):
@@ -121,6 +152,20 @@ class AddRecordFrame(tk.Frame):
             entry.delete(0, tk.END)
 
 class ViewRecordsFrame(tk.Frame):
+    # A small first chunk fills the screen quickly; later chunks are larger
+    FIRST_CHUNK_SIZE = 50
+    CHUNK_SIZE = 200
+    # Rows streamed in with after() once the first chunk is shown; beyond this
+    # only scrolling loads more
+    PREFETCH_ROWS = 2000
+    PREFETCH_DELAY_MS = 50
+    SEARCH_LIMIT = 500
+    # Typing pause before the search query is sent
+    SEARCH_DELAY_MS = 250
+    # Fetch the next chunk once the view is scrolled past this fraction
+    LOAD_MORE_AT = 0.9
+    HEADINGS = {"id": "ID", "name": "Name", "age": "Age", "address": "Address", "contact": "Contact", "email": "Email"}
+
     def __init__(self, parent, controller):
         super().__init__(parent, bg="#f0f0f0")
         self.controller = controller
@@ -131,16 +176,42 @@ class ViewRecordsFrame(tk.Frame):
         ttk.Label(top_frame, text="Records List", style="Title.TLabel").pack(side="left", padx=20)
         ttk.Button(top_frame, text="Back to Menu", command=lambda: controller.show_frame("MainMenu")).pack(side="right", padx=20)
         
+        # Search box; queries the full-text index as the user types
+        self.search_var = tk.StringVar()
+        ttk.Entry(top_frame, textvariable=self.search_var, width=24).pack(side="right")
+        ttk.Label(top_frame, text="Search:").pack(side="right", padx=5)
+        self.search_var.trace_add("write", lambda *args: self._schedule_search())
+        self.query = ""
+        self._search_after_id = None
+        
+        # Column filters; applied in SQL together with the current sort order
+        filter_frame = tk.Frame(self, bg="#f0f0f0")
+        filter_frame.pack(fill="x", padx=10, pady=(0, 5))
+        self.filter_vars = {}
+        for key, text, width in (("name_prefix", "Name starts", 10), ("age_min", "Age from", 4),
+                                 ("age_max", "to", 4), ("email_domain", "Domain", 12)):
+            ttk.Label(filter_frame, text=text + ":", font=("Arial", 10)).pack(side="left", padx=(5, 2))
+            var = tk.StringVar()
+            ttk.Entry(filter_frame, textvariable=var, width=width).pack(side="left")
+            self.filter_vars[key] = var
+        ttk.Button(filter_frame, text="Clear", command=self.clear_filters).pack(side="right", padx=2)
+        ttk.Button(filter_frame, text="Apply", command=self.apply_filters).pack(side="right", padx=2)
+        self.count_lbl = ttk.Label(filter_frame, text="", font=("Arial", 10))
+        self.count_lbl.pack(side="right", padx=5)
+        self.filters = {}
+        self.sort_column = "id"
+        self.sort_desc = False
+        
         # Treeview
         columns = ("id", "name", "age", "address", "contact", "email")
-        self.tree = ttk.Treeview(self, columns=columns, show="headings")
+        # Extended selection: shift/ctrl-click (or Ctrl+A) to act on many records at once
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", selectmode="extended")
+        self.tree.bind("<Control-a>", lambda e: self.tree.selection_set(self.tree.get_children()))
         
-        self.tree.heading("id", text="ID")
-        self.tree.heading("name", text="Name")
-        self.tree.heading("age", text="Age")
-        self.tree.heading("address", text="Address")
-        self.tree.heading("contact", text="Contact")
-        self.tree.heading("email", text="Email")
+        # Clicking a heading sorts by that column (again to reverse)
+        for column in columns:
+            self.tree.heading(column, text=self.HEADINGS[column], command=lambda c=column: self.sort_by(c))
+        self._update_headings()
         
         self.tree.column("id", width=30, anchor="center")
         self.tree.column("name", width=120)
@@ -149,12 +220,12 @@ class ViewRecordsFrame(tk.Frame):
         self.tree.column("contact", width=90)
         self.tree.column("email", width=120)
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
+        # Add scrollbar; scrolling near the end lazily loads the next chunk
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscroll=self._on_tree_scroll)
         
         self.tree.pack(side="top", fill="both", expand=True, padx=10)
-        scrollbar.pack(side="right", fill="y")
+        self.scrollbar.pack(side="right", fill="y")
         
         # Action Buttons
         action_frame = tk.Frame(self, bg="#f0f0f0")
@@ -163,21 +234,194 @@ class ViewRecordsFrame(tk.Frame):
         ttk.Button(action_frame, text="Edit Selected", command=self.edit_record).pack(side="left", padx=5)
         ttk.Button(action_frame, text="Delete Selected", command=self.delete_record).pack(side="left", padx=5)
         
+        self.loaded = False
+        # Bumped on every reload so chunks from an earlier load are dropped
+        self.generation = 0
+        self.last_id = None
+        self.exhausted = False
+        self.loading_chunk = False
+        # Ids deleted while a load is streaming in, so late chunks don't resurrect them
+        self.deleted_during_load = set()
+        # The Record behind each item: the Treeview's values come back converted
+        # by Tcl (contact "0917..." as an int), and edits and deletes need the
+        # row version so changes made elsewhere are caught
+        self.records = {}
+        # Patch individual rows when records change instead of reloading the tree
+        controller.worker.subscribe(self.on_records_changed)
+        
     def on_show(self):
-        self.load_records()
+        if not self.loaded:
+            self.load_records()
         
     def load_records(self):
+        self.loaded = True
+        self.generation += 1
+        self.deleted_during_load = set()
+        self.last_id = None
+        self.exhausted = False
+        self.loading_chunk = False
         # Clear existing
         for i in self.tree.get_children():
             self.tree.delete(i)
-            
-        try:
-            db = Database()
-            records = db.get_records()
-            for row in records:
-                self.tree.insert("", "end", values=row)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load records: {e}")
+        self.records = {}
+        generation = self.generation
+        self.controller.worker.submit(self.controller.db.count_records, self.filters,
+                                      on_done=lambda total: self._on_count(total, generation))
+        self._load_more()
+
+    def _on_count(self, total, generation):
+        if generation == self.generation:
+            self.count_lbl.config(text=f"{total} records")
+
+    def _order_by(self):
+        return ("-" if self.sort_desc else "") + self.sort_column
+
+    def _load_more(self):
+        if self.query or self.exhausted or self.loading_chunk:
+            return
+        self.loading_chunk = True
+        generation = self.generation
+        limit = self.FIRST_CHUNK_SIZE if self.last_id is None else self.CHUNK_SIZE
+        self.controller.worker.submit(
+            self.controller.db.get_records_page, self.last_id, limit, self._order_by(),
+            filters=self.filters,
+            on_done=lambda rows: self._on_chunk(rows, generation, limit),
+            on_error=lambda e: self._on_chunk_error(e, generation))
+
+    def _on_chunk(self, rows, generation, limit):
+        if generation != self.generation:
+            return
+        self.loading_chunk = False
+        for row in rows:
+            # Items are keyed by record id so changes can find them directly
+            if not self.tree.exists(row.id) and row.id not in self.deleted_during_load:
+                self.tree.insert("", "end", iid=row.id, values=row.as_tuple())
+                self.records[row.id] = row
+        if rows:
+            self.last_id = rows[-1].id
+        if len(rows) < limit:
+            self.exhausted = True
+            self.deleted_during_load = set()
+        elif self.tree.yview()[1] >= self.LOAD_MORE_AT:
+            # Still not enough rows to fill the view
+            self._load_more()
+        elif len(self.tree.get_children()) < self.PREFETCH_ROWS:
+            # Stream the next chunk in while the UI is idle
+            self.after(self.PREFETCH_DELAY_MS, lambda: generation == self.generation and self._load_more())
+
+    def _on_chunk_error(self, error, generation):
+        if generation == self.generation:
+            self.loading_chunk = False
+        messagebox.showerror("Error", f"Failed to load records: {error}")
+
+    def _on_tree_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) >= self.LOAD_MORE_AT:
+            self._load_more()
+
+    def sort_by(self, column):
+        if self.query:
+            return  # Search results stay in relevance order
+        if column == self.sort_column:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_column, self.sort_desc = column, False
+        self._update_headings()
+        self.load_records()
+
+    def _update_headings(self):
+        for column, text in self.HEADINGS.items():
+            if column == self.sort_column:
+                text += " ▼" if self.sort_desc else " ▲"
+            self.tree.heading(column, text=text)
+
+    def apply_filters(self):
+        filters = {key: var.get().strip() for key, var in self.filter_vars.items() if var.get().strip()}
+        for key in ("age_min", "age_max"):
+            if key in filters and not filters[key].isdigit():
+                messagebox.showerror("Error", "Age filters must be whole numbers.")
+                return
+        self.filters = filters
+        if not self.query:
+            self.load_records()
+
+    def clear_filters(self):
+        for var in self.filter_vars.values():
+            var.set("")
+        self.apply_filters()
+
+    def _schedule_search(self):
+        # Debounce: only query once typing pauses
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(self.SEARCH_DELAY_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_after_id = None
+        self.query = self.search_var.get().strip()
+        if not self.query:
+            self.load_records()
+            return
+        self.loaded = True
+        self.generation += 1
+        generation = self.generation
+        self.controller.worker.submit(
+            self.controller.db.search, self.query, self.SEARCH_LIMIT,
+            on_done=lambda rows: self._on_search_results(rows, generation),
+            on_error=lambda e: messagebox.showerror("Error", f"Search failed: {e}"))
+
+    def _on_search_results(self, rows, generation):
+        if generation != self.generation:
+            return
+        for i in self.tree.get_children():
+            self.tree.delete(i)
+        self.records = {row.id: row for row in rows}
+        for row in rows:
+            self.tree.insert("", "end", iid=row.id, values=row.as_tuple())
+        self.count_lbl.config(text=f"{len(rows)} matches")
+
+    def on_records_changed(self, event, ids):
+        if not self.loaded:
+            return
+        if self.query:
+            # Any change may alter the matches or their ranking
+            self._run_search()
+            return
+        if event == "deleted":
+            self.deleted_during_load.update(ids)
+            for record_id in ids:
+                self.records.pop(record_id, None)
+                if self.tree.exists(record_id):
+                    self.tree.delete(record_id)
+            if self.last_id in ids:
+                # Keyset paging needs a row that still exists to continue from
+                children = self.tree.get_children()
+                self.last_id = int(children[-1]) if children else None
+            self._refresh_count()
+            return
+        if event == "inserted" and (self.filters or self.sort_column != "id" or self.sort_desc):
+            # New rows may belong anywhere in a sorted/filtered view
+            self.load_records()
+            return
+        self.controller.worker.submit(self.controller.db.get_records_by_ids, ids,
+                                      on_done=lambda rows: self._on_changed_rows(event, rows))
+
+    def _refresh_count(self):
+        generation = self.generation
+        self.controller.worker.submit(self.controller.db.count_records, self.filters,
+                                      on_done=lambda total: self._on_count(total, generation))
+
+    def _on_changed_rows(self, event, rows):
+        for row in rows:
+            if self.tree.exists(row.id):
+                self.tree.item(row.id, values=row.as_tuple())
+                self.records[row.id] = row
+            elif self.exhausted:
+                # New ids sort last; if the tail isn't loaded yet they arrive with it
+                self.tree.insert("", "end", iid=row.id, values=row.as_tuple())
+                self.records[row.id] = row
+        if event == "inserted":
+            self._refresh_count()
             
     def delete_record(self):
         selected = self.tree.selection()
@@ -185,33 +429,51 @@ class ViewRecordsFrame(tk.Frame):
             messagebox.showwarning("Warning", "Please select a record to delete.")
             return
             
-        if messagebox.askyesno("Confirm", "Are you sure you want to delete this record?"):
-            try:
-                item = self.tree.item(selected[0])
-                record_id = item['values'][0]
-                db = Database()
-                db.delete_record(record_id)
-                self.load_records()
-            except Exception as e:
-                 messagebox.showerror("Error", f"Failed to delete: {e}")
+        prompt = "this record" if len(selected) == 1 else f"these {len(selected)} records"
+        if not messagebox.askyesno("Confirm", f"Are you sure you want to delete {prompt}?"):
+            return
+        if len(selected) == 1:
+            # Only deletes the version on screen
+            record = self.records[int(selected[0])]
+            self._delete_one(record.id, record.version)
+            return
+        # One transaction and one change notification for the whole selection
+        record_ids = [int(iid) for iid in selected]
+        self.controller.worker.submit(self.controller.db.delete_records, record_ids,
+                                      on_error=lambda e: messagebox.showerror("Error", f"Failed to delete: {e}"))
+
+    def _delete_one(self, record_id, version):
+        self.controller.worker.submit(self.controller.db.delete_record, record_id, expected_version=version,
+                                      on_error=self._on_delete_error)
+
+    def _on_delete_error(self, e):
+        if isinstance(e, ConflictError):
+            if messagebox.askyesno("Record Changed",
+                                   f"{e}\n\nIt now reads:\n{e.current.name}, {e.current.email}\n\nDelete it anyway?"):
+                self._delete_one(e.current.id, e.current.version)
+        else:
+            messagebox.showerror("Error", f"Failed to delete: {e}")
                  
     def edit_record(self):
         selected = self.tree.selection()
         if not selected:
             messagebox.showwarning("Warning", "Please select a record to edit.")
             return
+        if len(selected) > 1:
+            BulkEditDialog(self, [int(iid) for iid in selected])
+            return
             
-        item = self.tree.item(selected[0])
-        values = item['values']
-        # values: (id, name, age, address, contact, email)
-        
-        EditDialog(self, values, self.load_records)
+        EditDialog(self, self.records[int(selected[0])])
 
 class EditDialog(tk.Toplevel):
-    def __init__(self, parent, record_values, callback):
+    def __init__(self, parent, record, callback=None):
         super().__init__(parent)
         self.callback = callback
-        self.record_id = record_values[0]
+        self.db = parent.controller.db
+        self.worker = parent.controller.worker
+        self.record_id = record.id
+        # Row version the form was filled from; saving fails if it has moved on
+        self.version = record.version
         self.title("Edit Record")
         self.geometry("400x400")
         
@@ -220,7 +482,7 @@ class EditDialog(tk.Toplevel):
         
         self.entries = {}
         labels = ["Name", "Age", "Address", "Contact", "Email"]
-        current_data = [record_values[1], record_values[2], record_values[3], record_values[4], record_values[5]]
+        current_data = [record.name, record.age, record.address, record.contact, record.email]
         
         for idx, text in enumerate(labels):
             tk.Label(form_frame, text=text + ":").grid(row=idx, column=0, padx=10, pady=8, sticky="e")
@@ -232,24 +494,91 @@ class EditDialog(tk.Toplevel):
         tk.Button(self, text="Save Changes", command=self.save).pack(pady=10)
         
     def save(self):
-        name = self.entries["Name"].get().strip()
-        age = self.entries["Age"].get().strip()
-        address = self.entries["Address"].get().strip()
-        contact = self.entries["Contact"].get().strip()
-        email = self.entries["Email"].get().strip()
-        
-        # Validation (Simplified for brevity, but should match Add)
-        if not all([name, age, address, contact, email]):
-             messagebox.showerror("Error", "All fields are required!")
-             return
-        
-        try:
-            db = Database()
-            db.update_record(self.record_id, name, int(age), address, contact, email)
+        data = {text: entry.get() for text, entry in self.entries.items()}
+        clean, errors = validate_record(data["Name"], data["Age"], data["Address"], data["Contact"], data["Email"])
+        if errors:
+            messagebox.showerror("Error", "\n".join(errors), parent=self)
+            return
+        
+        self.worker.submit(self.db.update_record, self.record_id, *clean, expected_version=self.version,
+                           on_done=self._on_saved, on_error=self._on_save_error)
+
+    def _on_saved(self, result):
+        if self.callback:
             self.callback()
+        self.destroy()
+
+    def _on_save_error(self, e):
+        if isinstance(e, DuplicateRecordError):
+            messagebox.showerror("Duplicate", "Another record with this Name or Email already exists.", parent=self)
+        elif isinstance(e, ConflictError):
+            self._on_conflict(e)
+        else:
+            messagebox.showerror("Error", str(e), parent=self)
+
+    def _on_conflict(self, e):
+        if e.current is None:
+            messagebox.showerror("Record Deleted", str(e), parent=self)
             self.destroy()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+            return
+        # Yes reloads the other user's values; No keeps these edits, and the
+        # next save overwrites theirs
+        reload = messagebox.askyesno("Record Changed", f"{e}\n\nLoad the latest values? "
+                                     "(No keeps your edits; saving again will replace theirs.)", parent=self)
+        self.version = e.current.version
+        if reload:
+            latest = [e.current.name, e.current.age, e.current.address, e.current.contact, e.current.email]
+            for text, value in zip(["Name", "Age", "Address", "Contact", "Email"], latest):
+                self.entries[text].delete(0, "end")
+                self.entries[text].insert(0, str(value))
+
+class BulkEditDialog(tk.Toplevel):
+    # Sets the same age/address/contact on every selected record; blank fields are left alone
+    FIELDS = ("Age", "Address", "Contact")
+
+    def __init__(self, parent, record_ids, callback=None):
+        super().__init__(parent)
+        self.callback = callback
+        self.db = parent.controller.db
+        self.worker = parent.controller.worker
+        self.record_ids = record_ids
+        self.title("Edit Records")
+        self.geometry("400x250")
+        
+        tk.Label(self, text=f"Update {len(record_ids)} records (leave a field blank to keep it)").pack(pady=(15, 0))
+        form_frame = tk.Frame(self)
+        form_frame.pack(pady=10, padx=20)
+        
+        self.entries = {}
+        for idx, text in enumerate(self.FIELDS):
+            tk.Label(form_frame, text=text + ":").grid(row=idx, column=0, padx=10, pady=8, sticky="e")
+            entry = tk.Entry(form_frame, width=25)
+            entry.grid(row=idx, column=1, padx=10, pady=8)
+            self.entries[text] = entry
+            
+        tk.Button(self, text="Apply to All", command=self.save).pack(pady=10)
+        
+    def save(self):
+        fields = {text.lower(): entry.get() for text, entry in self.entries.items() if entry.get().strip()}
+        if not fields:
+            messagebox.showerror("Error", "Enter at least one value to change.", parent=self)
+            return
+        
+        fields, errors = validate_changes(fields)
+        if errors:
+            messagebox.showerror("Error", "\n".join(errors), parent=self)
+            return
+        
+        changes = {record_id: fields for record_id in self.record_ids}
+        self.worker.submit(self.db.update_records, changes, on_done=self._on_saved, on_error=self._on_save_error)
+
+    def _on_saved(self, result):
+        if self.callback:
+            self.callback()
+        self.destroy()
+
+    def _on_save_error(self, e):
+        messagebox.showerror("Error", str(e), parent=self)
 
 if __name__ == "__main__":
     app = RecordSystemApp()
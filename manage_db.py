@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from database import BACKUP_PAGES, INSTRUMENT_FILE, VACUUM_PAGES, Database
+from instrumentation import format_report
+from migrations import BACKFILL_BATCH_SIZE
+
+
+def cmd_import(db, args):
+    start = time.perf_counter()
+    inserted, rejects = db.import_csv(args.path, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"Imported {inserted} records in {elapsed:.2f}s ({len(rejects)} rejected)")
+    for line, row, reason in rejects[:args.show_rejects]:
+        print(f"  line {line}: {reason}: {dict(row) if isinstance(row, dict) else row}", file=sys.stderr)
+    if len(rejects) > args.show_rejects:
+        print(f"  ... {len(rejects) - args.show_rejects} more", file=sys.stderr)
+    return 1 if rejects and not inserted else 0
+
+
+def cmd_export(db, args):
+    start = time.perf_counter()
+    count = db.export_csv(args.path)
+    print(f"Exported {count} records to {args.path} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_migrate(db, args):
+    # Upgrades the schema with progress output; the apps do the same silently on open
+    start = time.perf_counter()
+    applied = db.migrate(batch_size=args.batch_size, progress=print)
+    print(f"Schema up to date ({len(applied)} migrations applied) in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_delta(db, args):
+    start = time.perf_counter()
+    since = args.since
+    target_id = None
+    if args.target:
+        # Start from what the target has already applied from this file, and
+        # leave out what this file got from the target in the first place
+        target = Database(args.target)
+        try:
+            since = target.synced_seq(db.replica_id())
+            target_id = target.replica_id()
+        finally:
+            target.close()
+    count, upto = db.export_changes(args.path, since=since, target=target_id)
+    print(f"Wrote {count} changed records (seq {since}..{upto}) to {args.path} "
+          f"in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_sync(db, args):
+    # Applying the same delta again is a no-op, so a failed nightly run can simply be repeated
+    start = time.perf_counter()
+    try:
+        applied, skipped, rejects = db.import_changes(args.path)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"Applied {applied} changes in {time.perf_counter() - start:.2f}s "
+          f"({skipped} already applied, {len(rejects)} rejected)")
+    for seq, record_id, reason in rejects[:args.show_rejects]:
+        print(f"  seq {seq} (id {record_id}): {reason}", file=sys.stderr)
+    if len(rejects) > args.show_rejects:
+        print(f"  ... {len(rejects) - args.show_rejects} more", file=sys.stderr)
+    return 0
+
+
+def progress_printer(label):
+    # progress(done, total) callback printing every tenth of the way
+    shown = [-1]
+
+    def progress(done, total):
+        tenth = done * 10 // total if total else 10
+        if tenth > shown[0]:
+            shown[0] = tenth
+            print(f"  {label}: {done}/{total} pages")
+    return progress
+
+
+def cmd_backup(db, args):
+    # Safe while the apps are open; they keep reading and writing during the copy
+    start = time.perf_counter()
+    pages = db.backup(args.path, pages=args.pages, progress=progress_printer("Backup"))
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(args.path) / 1024 / 1024
+    print(f"Backed up {pages} pages ({size_mb:.1f} MB) to {args.path} in {elapsed:.2f}s "
+          f"({size_mb / elapsed if elapsed else 0:.1f} MB/s)")
+    return 0
+
+
+def cmd_restore(db, args):
+    start = time.perf_counter()
+    try:
+        db.restore(args.path, progress=progress_printer("Restore"))
+    except (OSError, ValueError, sqlite3.DatabaseError) as e:
+        print(f"Restore failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Restored {db.count_records()} records from {args.path} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_vacuum(db, args):
+    start = time.perf_counter()
+    before = os.path.getsize(args.db)
+    freed = db.vacuum(pages=args.pages, progress=progress_printer("Vacuum"))
+    db.checkpoint("TRUNCATE")
+    saved_mb = (before - os.path.getsize(args.db)) / 1024 / 1024
+    print(f"Freed {freed} pages ({saved_mb:.1f} MB) in {time.perf_counter() - start:.2f}s")
+    if args.analyze:
+        start = time.perf_counter()
+        db.analyze()
+        print(f"Updated query planner statistics in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_analyze(db, args):
+    start = time.perf_counter()
+    db.analyze()
+    print(f"Updated query planner statistics in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_report(db, args):
+    # Reads the snapshot an instrumented app wrote on exit (RMS_DB_INSTRUMENT=1)
+    try:
+        with open(args.path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        print(f"No instrumentation data at {args.path}; run the app with RMS_DB_INSTRUMENT=1 first",
+              file=sys.stderr)
+        return 1
+    print(format_report(snapshot, top=args.top))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Student record database maintenance")
+    parser.add_argument("--db", default="records.db", help="database file (default: records.db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="bulk import records from a CSV file")
+    p.add_argument("path")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.add_argument("--show-rejects", type=int, default=20, help="rejected rows to print")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export", help="export all records to a CSV file")
+    p.add_argument("path")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("migrate", help="upgrade an older database file, showing backfill progress")
+    p.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="rows per backfill transaction")
+    p.set_defaults(func=cmd_migrate, bootstrap=False)
+
+    p = sub.add_parser("delta", help="write the records changed since a change-log seq to a delta file")
+    p.add_argument("path")
+    p.add_argument("--since", type=int, default=0, help="last seq the target has applied (default: everything)")
+    p.add_argument("--target", help="database the delta is for; --since is read from it")
+    p.set_defaults(func=cmd_delta)
+
+    p = sub.add_parser("sync", help="apply a delta file from another database")
+    p.add_argument("path")
+    p.add_argument("--show-rejects", type=int, default=20, help="rejected changes to print")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("backup", help="copy the database to a file while it stays in use")
+    p.add_argument("path")
+    p.add_argument("--pages", type=int, default=BACKUP_PAGES, help="pages copied per step")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("restore", help="replace every record with the contents of a backup file")
+    p.add_argument("path")
+    p.set_defaults(func=cmd_restore)
+
+    p = sub.add_parser("vacuum", help="return space freed by deletes to the file system")
+    p.add_argument("--pages", type=int, default=VACUUM_PAGES, help="pages freed per transaction")
+    p.add_argument("--analyze", action="store_true", help="also refresh query planner statistics")
+    p.set_defaults(func=cmd_vacuum)
+
+    p = sub.add_parser("analyze", help="refresh query planner statistics (ANALYZE)")
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser("report", help="print timings and slow statements recorded with RMS_DB_INSTRUMENT=1")
+    p.add_argument("path", nargs="?", default=INSTRUMENT_FILE or "db_instrumentation.json")
+    p.add_argument("--top", type=int, default=15, help="statements to list by total time")
+    p.set_defaults(func=cmd_report, needs_db=False)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not getattr(args, "needs_db", True):
+        return args.func(None, args)
+    db = Database(args.db, bootstrap=getattr(args, "bootstrap", True))
+    try:
+        return args.func(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,535 @@
+import threading
+from collections import Counter
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+from migrations import AGE_LABELS, BACKFILL_BATCH_SIZE, age_bracket
+from record import Record
+from storage import SEARCH_TOKEN_RE, ConflictError, DuplicateRecordError, Storage, instrumented, projected_columns
+from validation import FIELDS, validate_rows
+
+# How often WriteBehindStorage saves pending changes to the file
+FLUSH_INTERVAL_S = 1.0
+# Record ids WriteBehindStorage reserves in the file at a time for rows it adds
+RESERVED_IDS = 100
+
+
+def _integer(value):
+    # SQLite's INTEGER affinity: numeric text is stored as a number
+    if isinstance(value, str) and value.strip().lstrip("+-").isdigit():
+        return int(value)
+    return value
+
+
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def _sort_key(column):
+    # Matches ORDER BY column, id: NULLs first, then values, id breaking ties
+    if column == "id":
+        return lambda record: (True, record.id, record.id)
+
+    def key(record):
+        value = getattr(record, column)
+        if column == "email" and value is not None:
+            # Database sorts emails COLLATE NOCASE (ASCII-only case folding)
+            value = value.translate(_ASCII_LOWER)
+        return (value is not None, value, record.id)
+    return key
+
+
+class MemoryStorage(Storage):
+    # Rows in a dict by id with secondary indexes on name and (case-folded)
+    # email; nothing touches the disk. Behaves like Database, including the
+    # duplicate rules, keyset pages and change events, so tests and
+    # benchmarks can run against it. Thread-safe.
+    def __init__(self, db_name=":memory:", instrument=None):
+        super().__init__(db_name, instrument)
+        self._records = {}
+        self._by_name = {}
+        self._by_email = {}
+        # Search index: lowercased word -> ids, plus the sorted word list used
+        # for prefix lookups (rebuilt when a new word shows up)
+        self._words = {}
+        self._postings = {}
+        self._vocabulary = None
+        # column -> (sort keys, records) in ascending order; dropped on every write
+        self._orders = {}
+        self._next_id = 1
+        self._lock = threading.RLock()
+
+    def _put(self, record):
+        old = self._records.get(record.id)
+        if old is not None:
+            self._unindex(old)
+        # ids only grow, so the dict stays in id order (updates keep their slot)
+        self._records[record.id] = record
+        self._by_name[record.name] = record.id
+        if record.email is not None:
+            self._by_email[record.email.lower()] = record.id
+        text = " ".join(str(value) for value in (record.name, record.address, record.email, record.contact)
+                        if value is not None)
+        words = self._words[record.id] = set(SEARCH_TOKEN_RE.findall(text.lower()))
+        for word in words:
+            ids = self._postings.get(word)
+            if ids is None:
+                ids = self._postings[word] = set()
+                self._vocabulary = None
+            ids.add(record.id)
+        self._orders.clear()
+
+    def _remove(self, record_id):
+        record = self._records.pop(record_id, None)
+        if record is not None:
+            self._unindex(record)
+            self._orders.clear()
+        return record
+
+    def _unindex(self, record):
+        for word in self._words.pop(record.id, ()):
+            ids = self._postings[word]
+            ids.discard(record.id)
+            if not ids:
+                del self._postings[word]
+        if self._by_name.get(record.name) == record.id:
+            del self._by_name[record.name]
+        if record.email is not None and self._by_email.get(record.email.lower()) == record.id:
+            del self._by_email[record.email.lower()]
+
+    def _changed(self, ids):
+        # Called under the lock after every write; WriteBehindStorage tracks dirty rows here
+        pass
+
+    def _new_id(self):
+        record_id = self._next_id
+        self._next_id += 1
+        return record_id
+
+    def _taken(self, name, email, record_id=None):
+        holder = self._by_name.get(name)
+        if holder is not None and holder != record_id:
+            return True
+        holder = self._by_email.get(email.lower()) if email is not None else None
+        return holder is not None and holder != record_id
+
+    def _project(self, records, columns):
+        columns = projected_columns(columns)
+        if columns is None:
+            return list(records)
+        return [Record(**{column: getattr(record, column) for column in columns}) for record in records]
+
+    def _ordered(self, column):
+        order = self._orders.get(column)
+        if order is None:
+            key = _sort_key(column)
+            records = sorted(self._records.values(), key=key) if column != "id" else list(self._records.values())
+            order = self._orders[column] = ([key(record) for record in records], records)
+        return order
+
+    def _matcher(self, filters):
+        tests = []
+        for key, value in (filters or {}).items():
+            if value is None or value == "":
+                continue
+            if key == "age_min":
+                tests.append(lambda r, v=int(value): r.age is not None and r.age >= v)
+            elif key == "age_max":
+                tests.append(lambda r, v=int(value): r.age is not None and r.age <= v)
+            elif key == "email_domain":
+                # Like the SQL expression: everything after the first "@" (the whole email if none)
+                tests.append(lambda r, v=str(value).lstrip("@").lower():
+                             r.email is not None and r.email[r.email.find("@") + 1:].lower() == v)
+            elif key == "name_prefix":
+                tests.append(lambda r, v=str(value).lower(): r.name.lower().startswith(v))
+            else:
+                raise ValueError(f"Unknown filter {key!r}")
+        if not tests:
+            return None
+        return lambda record: all(test(record) for test in tests)
+
+    @instrumented
+    def add_record(self, name, age, address, contact, email):
+        with self._lock:
+            if self._taken(name, email):
+                raise DuplicateRecordError("A record with this Name or Email already exists.")
+            record_id = self._new_id()
+            self._put(Record(record_id, name, _integer(age), address, contact, email, 1))
+            self._changed([record_id])
+        self._notify("inserted", [record_id])
+        return record_id
+
+    @instrumented
+    def add_records(self, rows, batch_size=500):
+        # Same contract as Database.add_records: (inserted, rejects), all or nothing per call
+        rejects = []
+        new_ids = []
+        with self._lock:
+            batch = []
+            for number, row in enumerate(rows, start=1):
+                batch.append((number, row))
+                if len(batch) >= batch_size:
+                    self._insert_batch(batch, new_ids, rejects)
+                    batch = []
+            if batch:
+                self._insert_batch(batch, new_ids, rejects)
+            self._changed(new_ids)
+        self._notify("inserted", new_ids)
+        rejects.sort(key=lambda reject: reject[0])
+        return len(new_ids), rejects
+
+    def _insert_batch(self, batch, new_ids, rejects):
+        clean_rows, errors = validate_rows([row for _, row in batch])
+        for (number, row), clean, row_errors in zip(batch, clean_rows, errors):
+            if row_errors:
+                rejects.append((number, row, "; ".join(row_errors)))
+            elif self._taken(clean[0], clean[4]):
+                rejects.append((number, row, "Duplicate name or email"))
+            else:
+                record_id = self._new_id()
+                self._put(Record(record_id, *clean, 1))
+                new_ids.append(record_id)
+
+    @instrumented
+    def get_records(self, columns=None):
+        with self._lock:
+            records = list(self._records.values())
+        return self._project(records, columns)
+
+    @instrumented
+    def get_record_by_id(self, record_id):
+        return self._records.get(record_id)
+
+    @instrumented
+    def get_records_by_ids(self, ids):
+        with self._lock:
+            return [self._records[i] for i in sorted(set(ids)) if i in self._records]
+
+    @instrumented
+    def get_records_page(self, after_id=None, limit=50, order_by="id", columns=None, filters=None):
+        descending = order_by.startswith("-")
+        column = order_by.lstrip("-")
+        if column not in Record.__slots__:
+            raise ValueError(f"Cannot order by {order_by!r}")
+        matches = self._matcher(filters)
+        with self._lock:
+            keys, records = self._ordered(column)
+            if after_id is None:
+                start, end = 0, len(records)
+            else:
+                anchor = self._records.get(after_id)
+                if anchor is None and column != "id":
+                    return []
+                anchor_key = (True, after_id, after_id) if column == "id" else _sort_key(column)(anchor)
+                if descending:
+                    start, end = 0, bisect_left(keys, anchor_key)
+                else:
+                    start, end = bisect_right(keys, anchor_key), len(records)
+            indices = range(end - 1, start - 1, -1) if descending else range(start, end)
+            page = (records[i] for i in indices)
+            if matches is not None:
+                page = filter(matches, page)
+            page = list(islice(page, limit))
+        return self._project(page, columns)
+
+    @instrumented
+    def id_at_offset(self, offset, order_by="id"):
+        descending = order_by.startswith("-")
+        column = order_by.lstrip("-")
+        if column not in Record.__slots__:
+            raise ValueError(f"Cannot order by {order_by!r}")
+        with self._lock:
+            records = self._ordered(column)[1]
+            if not 0 <= offset < len(records):
+                return None
+            return records[len(records) - 1 - offset if descending else offset].id
+
+    def iter_records(self, batch_size=500, columns=None):
+        # A snapshot taken up front, so writes while iterating aren't seen
+        with self._lock:
+            records = list(self._records.values())
+        for start in range(0, len(records), batch_size):
+            yield from self._project(records[start:start + batch_size], columns)
+
+    @instrumented
+    def count_records(self, filters=None):
+        matches = self._matcher(filters)
+        with self._lock:
+            if matches is None:
+                return len(self._records)
+            return sum(1 for record in self._records.values() if matches(record))
+
+    @instrumented
+    def search(self, query, limit=50):
+        # Every word must be a prefix of some word in a field; ordered by name
+        tokens = [token.lower() for token in SEARCH_TOKEN_RE.findall(query)]
+        if not tokens:
+            return []
+        with self._lock:
+            if self._vocabulary is None:
+                self._vocabulary = sorted(self._postings)
+            vocabulary = self._vocabulary
+            found = None
+            for token in sorted(set(tokens), key=len, reverse=True):
+                ids = set()
+                for i in range(bisect_left(vocabulary, token), len(vocabulary)):
+                    if not vocabulary[i].startswith(token):
+                        break
+                    ids.update(self._postings.get(vocabulary[i], ()))
+                found = ids if found is None else found & ids
+                if not found:
+                    return []
+            found = [self._records[record_id] for record_id in found]
+        found.sort(key=_sort_key("name"))
+        return found[:limit]
+
+    @instrumented
+    def stats(self, top_domains=10):
+        # Same shape as Database.stats, counted from the dict on each call
+        with self._lock:
+            records = list(self._records.values())
+        ages = Counter(age_bracket(record.age) for record in records)
+        domains = Counter("" if record.email is None else record.email[record.email.find("@") + 1:].lower()
+                          for record in records)
+        by_domain = sorted(domains.items(), key=lambda item: (-item[1], item[0]))[:top_domains]
+        return {"total": len(records), "by_age": [(label, ages.get(label, 0)) for label in AGE_LABELS],
+                "by_domain": by_domain, "domains": len(domains)}
+
+    @instrumented
+    def verify_not_exists(self, name, email, exclude_id=None):
+        with self._lock:
+            return not self._taken(name, email, exclude_id or None)
+
+    @instrumented
+    def update_record(self, record_id, name, age, address, contact, email, expected_version=None):
+        with self._lock:
+            current = self._records.get(record_id)
+            if current is None:
+                if expected_version is not None:
+                    raise ConflictError("This record has been deleted by another user.")
+                return
+            if expected_version is not None and current.version != expected_version:
+                raise ConflictError("This record was changed by another user after you opened it.", current)
+            if self._taken(name, email, record_id):
+                raise DuplicateRecordError("Another record with this Name or Email already exists.")
+            self._put(Record(record_id, name, _integer(age), address, contact, email, current.version + 1))
+            self._changed([record_id])
+        self._notify("updated", [record_id])
+
+    @instrumented
+    def update_records(self, changes):
+        # changes maps record id -> {field: new value}; a duplicate name/email
+        # anywhere in the batch leaves every record unchanged
+        changes = {record_id: dict(fields) for record_id, fields in dict(changes).items() if fields}
+        for fields in changes.values():
+            unknown = [f for f in fields if f not in FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        with self._lock:
+            updated = {}
+            for record_id in sorted(changes):
+                record = self._records.get(record_id)
+                if record is None:
+                    continue
+                values = {field: getattr(record, field) for field in FIELDS}
+                values.update(changes[record_id])
+                values["age"] = _integer(values["age"])
+                updated[record_id] = Record(record_id, version=record.version + 1, **values)
+            # The batch's end state must be unique among itself and against
+            # the rows it leaves alone
+            names = {}
+            emails = {}
+            for record_id, record in updated.items():
+                email = record.email.lower() if record.email is not None else None
+                holders = (self._by_name.get(record.name), self._by_email.get(email) if email is not None else None)
+                if names.setdefault(record.name, record_id) != record_id \
+                        or email is not None and emails.setdefault(email, record_id) != record_id \
+                        or any(holder not in (None, record_id) and holder not in updated for holder in holders):
+                    raise DuplicateRecordError("Another record with this Name or Email already exists.")
+            for record in updated.values():
+                self._put(record)
+            self._changed(list(updated))
+        self._notify("updated", list(updated))
+        return list(updated)
+
+    @instrumented
+    def delete_record(self, record_id, expected_version=None):
+        with self._lock:
+            current = self._records.get(record_id)
+            if expected_version is not None and current is not None and current.version != expected_version:
+                raise ConflictError("This record was changed by another user after you opened it.", current)
+            if self._remove(record_id) is None:
+                return
+            self._changed([record_id])
+        self._notify("deleted", [record_id])
+
+    @instrumented
+    def delete_records(self, ids):
+        with self._lock:
+            deleted = sorted(record_id for record_id in set(ids) if self._remove(record_id) is not None)
+            self._changed(deleted)
+        self._notify("deleted", deleted)
+        return deleted
+
+    def load(self, records, next_id=None):
+        # Replaces the contents wholesale (no events), e.g. when hydrating from disk
+        with self._lock:
+            self._records = {}
+            self._by_name = {}
+            self._by_email = {}
+            self._words = {}
+            self._postings = {}
+            self._vocabulary = None
+            self._orders = {}
+            for record in sorted(records, key=lambda record: record.id):
+                self._put(record)
+            last_id = max(self._records, default=0)
+            self._next_id = max(last_id, next_id or 0) + 1
+
+
+class WriteBehindStorage(MemoryStorage):
+    # For read-heavy kiosks: the whole table is loaded into memory once, reads
+    # never touch the disk, and writes are saved to the backing Database by a
+    # background thread every flush_interval_s (and on close). Edits made by
+    # other desks are picked up on the next tick. Ids for new rows are reserved
+    # in the file up front, and a row another desk changed before an edit here
+    # was saved keeps the desk's version (flush raises ConflictError).
+    def __init__(self, backing, flush_interval_s=FLUSH_INTERVAL_S, bootstrap=True):
+        super().__init__(backing.db_name, instrument=False)
+        self.backing = backing
+        # One set of timings for both layers
+        self.instrumentation = backing.instrumentation
+        self.flush_interval_s = flush_interval_s
+        self.last_flush_error = None
+        self._dirty = set()
+        # id -> version of the row in the file, as last read or written here
+        self._stored = {}
+        self._reserved_end = 0
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+        if bootstrap:
+            self.create_table()
+
+    def migrate(self, batch_size=BACKFILL_BATCH_SIZE, progress=None, backfill=True):
+        # Upgrades the file, loads it, then starts saving changes in the background
+        applied = self.backing.migrate(batch_size=batch_size, progress=progress, backfill=backfill)
+        if self._flusher is None:
+            self.hydrate()
+            self._flusher = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+            self._flusher.start()
+        return applied
+
+    def start_backfills(self):
+        self.backing.start_backfills()
+
+    def hydrate(self):
+        records = list(self.backing.iter_records(batch_size=5000))
+        with self._lock:
+            self.load(records)
+            self._stored = {record.id: record.version for record in records}
+
+    def _changed(self, ids):
+        self._dirty.update(ids)
+
+    def _new_id(self):
+        if self._next_id >= self._reserved_end:
+            self._next_id = self.backing.reserve_ids(RESERVED_IDS)
+            self._reserved_end = self._next_id + RESERVED_IDS
+        return super()._new_id()
+
+    def pending_writes(self):
+        with self._lock:
+            return len(self._dirty)
+
+    def flush(self):
+        # Saves every change made so far; returns how many rows were written.
+        # Rows changed in the file since they were read here are reloaded
+        # instead, and a ConflictError names them once the rest are saved.
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                records = [self._records[i] for i in sorted(dirty) if i in self._records]
+                versions = {i: self._stored[i] for i in dirty if i in self._stored}
+            if not dirty:
+                return 0
+            try:
+                conflicts = self.backing.write_back(sorted(dirty), records, versions)
+            except Exception:
+                with self._lock:
+                    self._dirty |= dirty
+                raise
+            with self._lock:
+                for record_id in dirty:
+                    self._stored.pop(record_id, None)
+                self._stored.update((record.id, record.version) for record in records)
+            if conflicts:
+                latest = {record.id: record for record in self.backing.get_records_by_ids(conflicts)}
+                events = {"inserted": [], "updated": [], "deleted": []}
+                with self._lock:
+                    for record_id in conflicts:
+                        self._dirty.discard(record_id)
+                        self._adopt(record_id, latest.get(record_id), events)
+                    if events["inserted"]:
+                        self.load(list(self._records.values()), self._next_id - 1)
+                for event, ids in events.items():
+                    self._notify(event, sorted(ids))
+                raise ConflictError(f"Records {', '.join(map(str, conflicts))} were changed by another user "
+                                    f"before the edits made here were saved; their changes were kept.")
+            return len(dirty)
+
+    def _adopt(self, record_id, record, events):
+        # Under the lock: makes the row match the file's (None: deleted there)
+        self._stored.pop(record_id, None)
+        if record is None:
+            if self._remove(record_id) is not None:
+                events["deleted"].append(record_id)
+            return
+        self._stored[record_id] = record.version
+        current = self._records.get(record_id)
+        if current != record or current.version != record.version:
+            self._put(record)
+            events["inserted" if current is None else "updated"].append(record_id)
+
+    def refresh(self):
+        # Reloads rows another desk changed; rows with unsaved local edits keep them
+        with self._flush_lock:
+            latest = {record.id: record for record in self.backing.iter_records(batch_size=5000)}
+            events = {"inserted": [], "updated": [], "deleted": []}
+            with self._lock:
+                for record_id in list(self._records):
+                    if record_id not in latest and record_id not in self._dirty:
+                        self._adopt(record_id, None, events)
+                for record_id, record in latest.items():
+                    if record_id not in self._dirty:
+                        self._adopt(record_id, record, events)
+                if events["inserted"]:
+                    # Keep the dict in id order after rows arrived from elsewhere
+                    self.load(list(self._records.values()), self._next_id - 1)
+        for event, ids in events.items():
+            self._notify(event, sorted(ids))
+
+    def _run(self):
+        version = self.backing.data_version()
+        while not self._stop.wait(self.flush_interval_s):
+            try:
+                self.flush()
+                # Our own commits don't move data_version on this connection
+                latest = self.backing.data_version()
+                if latest != version:
+                    version = latest
+                    self.refresh()
+                self.last_flush_error = None
+            except Exception as e:
+                # Still dirty; retried on the next tick and surfaced by close()
+                self.last_flush_error = e
+
+    def close(self):
+        if self._flusher is not None:
+            self._stop.set()
+            self._flusher.join()
+            self._flusher = None
+        try:
+            self.flush()
+        finally:
+            self.backing.close()
+            super().close()
@@ -0,0 +1,484 @@
+import sqlite3
+import time
+
+# Versioned schema upgrades for records.db. PRAGMA user_version holds the last
+# applied migration; each migration runs in its own transaction together with
+# the version bump, so a failed upgrade leaves the file at the previous version.
+# Work proportional to the table size is not done inside a migration: it
+# registers a backfill instead, which is then run in short chunked transactions
+# (resuming where it stopped if the app is closed half way).
+
+EMAIL_DOMAIN_SQL = "lower(substr(email, instr(email, '@') + 1))"
+# Histogram buckets for the statistics screen: (exclusive upper age, label);
+# the last bucket is open-ended and non-numeric ages count as "unknown"
+AGE_BRACKETS = ((18, "under 18"), (21, "18-20"), (25, "21-24"), (30, "25-29"), (40, "30-39"), (None, "40+"))
+AGE_LABELS = tuple(label for _, label in AGE_BRACKETS) + ("unknown",)
+BACKFILL_BATCH_SIZE = 2000
+# Pause between backfill chunks so other desks' writes get the lock in between
+BACKFILL_PAUSE_S = 0.005
+
+
+class MigrationError(sqlite3.DatabaseError):
+    pass
+
+
+def _create_records(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            age INTEGER,
+            address TEXT,
+            contact TEXT,
+            email TEXT
+        )
+    """)
+
+
+# (index, target, field): names are unique as typed, emails case-insensitively
+UNIQUE_INDEXES = (
+    ("idx_records_name", "records(name)", "name"),
+    ("idx_records_email", "records(email COLLATE NOCASE)", "email"),
+)
+
+
+def _create_indexes(cursor):
+    # Databases that already contain duplicates get plain indexes so lookups
+    # stay indexed; ensure_unique_indexes upgrades them once the duplicates are gone
+    for index_name, target, _ in UNIQUE_INDEXES:
+        cursor.execute("SAVEPOINT unique_index")
+        try:
+            cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {target}")
+        except sqlite3.IntegrityError:
+            cursor.execute("ROLLBACK TO unique_index")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}")
+        cursor.execute("RELEASE unique_index")
+    # Sorting and filtering support: age order/range, case-insensitive name
+    # prefix (LIKE can use a NOCASE index) and exact email-domain lookups
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_records_age ON records(age)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_records_name_nocase ON records(name COLLATE NOCASE)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_records_email_domain ON records({EMAIL_DOMAIN_SQL})")
+
+
+def _create_sort_indexes(cursor):
+    # Every list column can be sorted on; name, age, id and email (its NOCASE
+    # index, which is how email is ordered) already have an index, these
+    # cover the rest so a sorted chunk is an index range rather than a full sort
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_records_address ON records(address)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_records_contact ON records(contact)")
+
+
+def _add_record_origins(cursor):
+    # Global identity for delta sync. Each database hands out ids on its own,
+    # so across databases a record is (origin, origin_id): the replica that
+    # created it and its id there. Rows created here leave both NULL (this
+    # replica, this id). The change log records the same pair, the version a
+    # delete removed, and source: the replica a change was applied from
+    # (NULL for local writes), so a delta back to it can leave it out.
+    for table, additions in (("records", (("origin", "TEXT"), ("origin_id", "INTEGER"))),
+                             ("change_log", (("origin", "TEXT"), ("origin_id", "INTEGER"), ("source", "TEXT")))):
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for column, kind in additions:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_records_origin ON records(origin, origin_id)
+        WHERE origin IS NOT NULL
+    """)
+    for op, row in (("insert", "new"), ("update", "new")):
+        cursor.execute(f"DROP TRIGGER IF EXISTS change_log_{op}")
+        cursor.execute(f"""
+            CREATE TRIGGER change_log_{op} AFTER {op.upper()} ON records BEGIN
+                INSERT INTO change_log (record_id, op, name, age, address, contact, email, version, origin, origin_id)
+                VALUES ({row}.id, '{op}', {row}.name, {row}.age, {row}.address, {row}.contact, {row}.email,
+                        {row}.version, {row}.origin, {row}.origin_id);
+            END
+        """)
+    cursor.execute("DROP TRIGGER IF EXISTS change_log_delete")
+    cursor.execute("""
+        CREATE TRIGGER change_log_delete AFTER DELETE ON records BEGIN
+            INSERT INTO change_log (record_id, op, version, origin, origin_id)
+            VALUES (old.id, 'delete', old.version, old.origin, old.origin_id);
+        END
+    """)
+
+
+def age_bracket(age):
+    # Python twin of age_bracket_sql
+    if not isinstance(age, int) or isinstance(age, bool):
+        return "unknown"
+    for upper, label in AGE_BRACKETS:
+        if upper is None or age < upper:
+            return label
+
+
+def age_bracket_sql(age):
+    cases = " ".join(f"WHEN {age} < {upper} THEN '{label}'" for upper, label in AGE_BRACKETS if upper is not None)
+    return f"CASE WHEN typeof({age}) != 'integer' THEN 'unknown' {cases} ELSE '{AGE_BRACKETS[-1][1]}' END"
+
+
+# Rows with last_id < id <= upto haven't been processed by the named backfill
+# yet; its triggers skip them so the backfill and concurrent writes never
+# count a row twice
+BACKFILL_PENDING = """EXISTS (SELECT 1 FROM schema_backfills
+                        WHERE name = '{name}' AND {id} > last_id AND {id} <= upto)"""
+FTS_PENDING = BACKFILL_PENDING.replace("{name}", "records_fts")
+
+
+def _create_search_index(cursor):
+    # External-content FTS5 table over records, kept in sync by triggers and
+    # filled for existing rows by the records_fts backfill
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='records_fts'")
+    if cursor.fetchone() is not None:
+        return
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE records_fts USING fts5(
+                name, address, email, contact,
+                content='records', content_rowid='id'
+            )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5; search() falls back to LIKE
+        return
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS records_fts_insert AFTER INSERT ON records
+        WHEN NOT {FTS_PENDING.format(id="new.id")} BEGIN
+            INSERT INTO records_fts(rowid, name, address, email, contact)
+            VALUES (new.id, new.name, new.address, new.email, new.contact);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS records_fts_delete AFTER DELETE ON records
+        WHEN NOT {FTS_PENDING.format(id="old.id")} BEGIN
+            INSERT INTO records_fts(records_fts, rowid, name, address, email, contact)
+            VALUES ('delete', old.id, old.name, old.address, old.email, old.contact);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS records_fts_update AFTER UPDATE ON records
+        WHEN NOT {FTS_PENDING.format(id="old.id")} BEGIN
+            INSERT INTO records_fts(records_fts, rowid, name, address, email, contact)
+            VALUES ('delete', old.id, old.name, old.address, old.email, old.contact);
+            INSERT INTO records_fts(rowid, name, address, email, contact)
+            VALUES (new.id, new.name, new.address, new.email, new.contact);
+        END
+    """)
+    register_backfill(cursor, "records_fts")
+
+
+def _backfill_records_fts(cursor, last_id, upto, batch_size):
+    cursor.execute("SELECT id FROM records WHERE id > ? AND id <= ? ORDER BY id LIMIT ?", (last_id, upto, batch_size))
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return upto
+    cursor.execute("""
+        INSERT INTO records_fts(rowid, name, address, email, contact)
+        SELECT id, name, address, email, contact FROM records WHERE id >= ? AND id <= ?
+    """, (ids[0], ids[-1]))
+    return ids[-1] if len(ids) == batch_size else upto
+
+
+def _add_row_versions(cursor):
+    # Bumped by every write so editors can detect a change made since they
+    # read the row. A constant default doesn't rewrite the table.
+    cursor.execute("PRAGMA table_info(records)")
+    if "version" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE records ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def _create_change_log(cursor):
+    # Append-only journal of every write to records, numbered by seq, with the
+    # row as it was after the change (just the id for deletes). Deltas for
+    # other databases are read from it (Database.changes_since); rows that
+    # predate it are logged as inserts by the change_log backfill.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            record_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            name TEXT,
+            age INTEGER,
+            address TEXT,
+            contact TEXT,
+            email TEXT,
+            version INTEGER,
+            changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Finds a record's latest change, so a delta carries each row only once
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_record ON change_log(record_id, seq)")
+    # This file's identity in delta files, and how far each other file's deltas have been applied
+    cursor.execute("CREATE TABLE IF NOT EXISTS sync_replica (id TEXT NOT NULL)")
+    cursor.execute("""
+        INSERT INTO sync_replica (id) SELECT lower(hex(randomblob(16)))
+        WHERE NOT EXISTS (SELECT 1 FROM sync_replica)
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_peers (
+            replica_id TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL
+        )
+    """)
+    for op, row in (("insert", "new"), ("update", "new")):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS change_log_{op} AFTER {op.upper()} ON records BEGIN
+                INSERT INTO change_log (record_id, op, name, age, address, contact, email, version)
+                VALUES ({row}.id, '{op}', {row}.name, {row}.age, {row}.address, {row}.contact, {row}.email,
+                        {row}.version);
+            END
+        """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS change_log_delete AFTER DELETE ON records BEGIN
+            INSERT INTO change_log (record_id, op) VALUES (old.id, 'delete');
+        END
+    """)
+    register_backfill(cursor, "change_log")
+
+
+def _backfill_change_log(cursor, last_id, upto, batch_size):
+    # Rows changed meanwhile are logged again here, after their trigger
+    # entries, with their current values, so the latest entry stays right
+    cursor.execute("SELECT id FROM records WHERE id > ? AND id <= ? ORDER BY id LIMIT ?", (last_id, upto, batch_size))
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return upto
+    cursor.execute("""
+        INSERT INTO change_log (record_id, op, name, age, address, contact, email, version)
+        SELECT id, 'insert', name, age, address, contact, email, version FROM records
+        WHERE id >= ? AND id <= ? ORDER BY id
+    """, (ids[0], ids[-1]))
+    return ids[-1] if len(ids) == batch_size else upto
+
+
+def _stat_keys(row):
+    # (kind, key SQL) pairs a row counts towards in record_stats
+    return (("total", "''"), ("age", age_bracket_sql(f"{row}.age")),
+            ("domain", f"COALESCE({EMAIL_DOMAIN_SQL.replace('email', f'{row}.email')}, '')"))
+
+
+def _create_record_stats(cursor):
+    # Counters behind Database.stats(): the total, one row per age bracket and
+    # one per email domain, kept current by triggers so reading them costs the
+    # same at any table size. Existing rows are counted by the record_stats backfill.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS record_stats (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (kind, key)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_record_stats_count ON record_stats(kind, count)")
+    cursor.execute("INSERT OR IGNORE INTO record_stats (kind, key, count) VALUES ('total', '', 0)")
+
+    def add(row, delta, total=True):
+        statements = []
+        for kind, key in _stat_keys(row):
+            if kind == "total" and not total:
+                continue
+            statements.append(f"INSERT OR IGNORE INTO record_stats (kind, key, count) VALUES ('{kind}', {key}, 0);")
+            statements.append(f"UPDATE record_stats SET count = count {delta} WHERE kind = '{kind}' AND key = {key};")
+            if kind != "total":
+                # Empty buckets are dropped so domains that disappear leave no row behind
+                statements.append(f"DELETE FROM record_stats WHERE kind = '{kind}' AND key = {key} AND count = 0;")
+        return "\n".join(statements)
+
+    pending = BACKFILL_PENDING.replace("{name}", "record_stats")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS record_stats_insert AFTER INSERT ON records
+        WHEN NOT {pending.format(id="new.id")} BEGIN
+            {add("new", "+ 1")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS record_stats_delete AFTER DELETE ON records
+        WHEN NOT {pending.format(id="old.id")} BEGIN
+            {add("old", "- 1")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS record_stats_update AFTER UPDATE OF age, email ON records
+        WHEN (old.age IS NOT new.age OR old.email IS NOT new.email) AND NOT {pending.format(id="old.id")} BEGIN
+            {add("new", "+ 1", total=False)}
+            {add("old", "- 1", total=False)}
+        END
+    """)
+    register_backfill(cursor, "record_stats")
+
+
+def _backfill_record_stats(cursor, last_id, upto, batch_size):
+    cursor.execute("SELECT id FROM records WHERE id > ? AND id <= ? ORDER BY id LIMIT ?", (last_id, upto, batch_size))
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return upto
+    for kind, key in _stat_keys("records"):
+        cursor.execute(f"SELECT {key}, COUNT(*) FROM records WHERE id >= ? AND id <= ? GROUP BY 1",
+                       (ids[0], ids[-1]))
+        for value, count in cursor.fetchall():
+            cursor.execute("INSERT OR IGNORE INTO record_stats (kind, key, count) VALUES (?, ?, 0)", (kind, value))
+            cursor.execute("UPDATE record_stats SET count = count + ? WHERE kind = ? AND key = ?", (count, kind, value))
+    return ids[-1] if len(ids) == batch_size else upto
+
+
+# (version, description, apply(cursor)); append only, never renumber
+MIGRATIONS = (
+    (1, "records table", _create_records),
+    (2, "unique, sort and filter indexes", _create_indexes),
+    (3, "full-text search index", _create_search_index),
+    (4, "row versions", _add_row_versions),
+    (5, "change log for delta sync", _create_change_log),
+    (6, "statistics counters", _create_record_stats),
+    (7, "address and contact sort indexes", _create_sort_indexes),
+    (8, "record origins for delta sync", _add_record_origins),
+)
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# name -> chunk(cursor, last_id, upto, batch_size), returning the new last_id
+BACKFILLS = {
+    "records_fts": _backfill_records_fts,
+    "change_log": _backfill_change_log,
+    "record_stats": _backfill_record_stats,
+}
+
+
+def register_backfill(cursor, name):
+    # Called from a migration: covers every row that exists right now; rows
+    # written afterwards are the migration's triggers' job
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM records")
+    upto = cursor.fetchone()[0]
+    if upto:
+        cursor.execute("INSERT OR REPLACE INTO schema_backfills (name, last_id, upto) VALUES (?, 0, ?)", (name, upto))
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=None, batch_size=BACKFILL_BATCH_SIZE, progress=None, backfill=True):
+    # Brings the file up to target (default: latest), retries any missing
+    # unique index and, unless backfill is False, finishes any pending
+    # backfills. Safe to run from several processes at once: each step
+    # re-checks the version under the write lock. Returns the applied versions.
+    target = LATEST_VERSION if target is None else target
+    applied = []
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_backfills (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            upto INTEGER NOT NULL
+        )
+    """)
+    conn.commit()
+    for version, description, apply in MIGRATIONS:
+        if version > target or schema_version(conn) >= version:
+            continue
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) < version:
+                apply(cursor)
+                # PRAGMA can't take parameters; version is an int from MIGRATIONS
+                cursor.execute(f"PRAGMA user_version = {int(version)}")
+                applied.append(version)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise MigrationError(f"Migration {version} ({description}) failed: {e}") from e
+        if progress:
+            progress(f"Applied migration {version}: {description}")
+    ensure_unique_indexes(conn, progress)
+    if backfill:
+        run_backfills(conn, batch_size, progress)
+    return applied
+
+
+def non_unique_fields(conn):
+    # Fields whose unique index is still a plain one (see _create_indexes)
+    unique = {row[1] for row in conn.execute("PRAGMA index_list(records)") if row[2]}
+    return [field for index_name, _, field in UNIQUE_INDEXES if index_name not in unique]
+
+
+def duplicate_values(conn, field):
+    # [(value, rows)] for every value of field held by more than one record
+    collate = " COLLATE NOCASE" if field == "email" else ""
+    return conn.execute(f"""
+        SELECT {field}{collate}, COUNT(*) FROM records WHERE {field} IS NOT NULL
+        GROUP BY {field}{collate} HAVING COUNT(*) > 1 ORDER BY 2 DESC, 1
+    """).fetchall()
+
+
+def ensure_unique_indexes(conn, progress=None):
+    # Retries, on every migrate(), the unique indexes a file with duplicates got
+    # plain ones instead of. The duplicates are looked up first (through the
+    # plain index), so a file that still has them costs no failed index build;
+    # they are reported through progress. Returns the fields still without one.
+    missing = non_unique_fields(conn)
+    cursor = conn.cursor()
+    for index_name, target, field in UNIQUE_INDEXES:
+        if field not in missing:
+            continue
+        duplicates = duplicate_values(conn, field)
+        if duplicates:
+            if progress:
+                shown = ", ".join(f"{value!r} ({count} records)" for value, count in duplicates[:10])
+                more = f" and {len(duplicates) - 10} more" if len(duplicates) > 10 else ""
+                progress(f"Duplicate {field}s prevent the unique {field} index: {shown}{more}. "
+                         f"Rename or remove them; the index is retried on the next start.")
+            continue
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have built it meanwhile
+            if field in non_unique_fields(conn):
+                cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+                cursor.execute(f"CREATE UNIQUE INDEX {index_name} ON {target}")
+            conn.commit()
+        except sqlite3.IntegrityError:
+            # A duplicate written since the lookup; next time
+            conn.rollback()
+            continue
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise MigrationError(f"Unique {field} index failed: {e}") from e
+        missing.remove(field)
+        if progress:
+            progress(f"Created the unique {field} index")
+    return missing
+
+
+def pending_backfills(conn):
+    return [row[0] for row in conn.execute("SELECT name FROM schema_backfills ORDER BY name")]
+
+
+def run_backfills(conn, batch_size=BACKFILL_BATCH_SIZE, progress=None, stop=None):
+    # stop (a threading.Event) ends the run between chunks; the next run resumes
+    cursor = conn.cursor()
+    for name in pending_backfills(conn):
+        chunk = BACKFILLS[name]
+        while True:
+            if stop is not None and stop.is_set():
+                return
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.execute("SELECT last_id, upto FROM schema_backfills WHERE name = ?", (name,))
+                row = cursor.fetchone()
+                if row is None:
+                    # Finished by another process meanwhile
+                    conn.commit()
+                    break
+                last_id, upto = row
+                last_id = chunk(cursor, last_id, upto, batch_size)
+                if last_id >= upto:
+                    cursor.execute("DELETE FROM schema_backfills WHERE name = ?", (name,))
+                else:
+                    cursor.execute("UPDATE schema_backfills SET last_id = ? WHERE name = ?", (last_id, name))
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                raise MigrationError(f"Backfill {name} failed: {e}") from e
+            if progress:
+                progress(f"Backfill {name}: {min(last_id, upto)}/{upto}")
+            if last_id >= upto:
+                break
+            time.sleep(BACKFILL_PAUSE_S)
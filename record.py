@@ -0,0 +1,53 @@
+class Record:
+    # Compact row type returned by every Database read. Fields are attributes,
+    # but it still unpacks and indexes like the (id, name, age, address,
+    # contact, email) tuples the app used before. version is the row version
+    # read with it (pass it back to update_record/delete_record to detect
+    # concurrent edits); it is not part of the tuple. Treat instances as
+    # read-only: the same object may be shared through the record cache.
+    __slots__ = ("id", "name", "age", "address", "contact", "email", "version")
+
+    def __init__(self, id=None, name=None, age=None, address=None, contact=None, email=None, version=None):
+        self.id = id
+        self.name = name
+        self.age = age
+        self.address = address
+        self.contact = contact
+        self.email = email
+        self.version = version
+
+    def as_tuple(self):
+        return (self.id, self.name, self.age, self.address, self.contact, self.email)
+
+    def __getitem__(self, index):
+        return self.as_tuple()[index]
+
+    def __iter__(self):
+        return iter(self.as_tuple())
+
+    def __len__(self):
+        return len(self.__slots__) - 1
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return self.as_tuple() == other.as_tuple()
+        if isinstance(other, tuple):
+            return self.as_tuple() == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def __repr__(self):
+        return f"Record(id={self.id!r}, name={self.name!r}, age={self.age!r}, address={self.address!r}, " \
+               f"contact={self.contact!r}, email={self.email!r}, version={self.version!r})"
+
+
+def record_factory(columns=None):
+    # Cursor row_factory building Records; projected queries leave the other fields None
+    if columns is None or tuple(columns) == Record.__slots__:
+        return lambda cursor, row: Record(*row)
+
+    def make(cursor, row):
+        return Record(**dict(zip(columns, row)))
+    return make
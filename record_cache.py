@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+
+class RecordCache:
+    # Bounded LRU of records by id plus a cache of list/page/count query results.
+    # Every write bumps the generation; query results are dropped wholesale and
+    # a result computed under an older generation is never stored.
+    def __init__(self, max_records=1024, max_queries=128):
+        self.max_records = max_records
+        self.max_queries = max_queries
+        self.generation = 0
+        self._records = OrderedDict()
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_record(self, record_id):
+        with self._lock:
+            if record_id in self._records:
+                self._records.move_to_end(record_id)
+                self.hits += 1
+                return True, self._records[record_id]
+            self.misses += 1
+            return False, None
+
+    def put_record(self, record_id, record, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._records[record_id] = record
+            self._records.move_to_end(record_id)
+            while len(self._records) > self.max_records:
+                self._records.popitem(last=False)
+                self.evictions += 1
+
+    def get_query(self, key):
+        with self._lock:
+            if key in self._queries:
+                self._queries.move_to_end(key)
+                self.hits += 1
+                return True, self._queries[key]
+            self.misses += 1
+            return False, None
+
+    def put_query(self, key, value, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._queries[key] = value
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+                self.evictions += 1
+
+    def record_written(self, record_id, record=None):
+        # Write-through for a single record; every cached list/count is now stale
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            self._queries.clear()
+            if record is None:
+                self._records.pop(record_id, None)
+            else:
+                self._records[record_id] = record
+                self._records.move_to_end(record_id)
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            self._queries.clear()
+            self._records.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "records": len(self._records),
+                "queries": len(self._queries),
+            }
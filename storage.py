@@ -0,0 +1,199 @@
+import csv
+import functools
+import os
+import re
+import sqlite3
+import threading
+from contextlib import nullcontext
+
+from instrumentation import Instrumentation, format_report
+from validation import FIELDS
+
+COLUMNS = ("id",) + FIELDS
+# Everything a whole Record is read with; version changes on every write
+RECORD_COLUMNS = COLUMNS + ("version",)
+# Filters understood by get_records_page/count_records
+FILTERS = ("age_min", "age_max", "email_domain", "name_prefix")
+# Splits a search box query into FTS tokens the same way unicode61 tokenizes rows
+SEARCH_TOKEN_RE = re.compile(r"\w+")
+
+# Opt-in profiling: RMS_DB_INSTRUMENT=1 records timings, statement counts and
+# slow statements, dumped to RMS_DB_INSTRUMENT_FILE on close (see manage_db.py report)
+DEFAULT_INSTRUMENT = os.environ.get("RMS_DB_INSTRUMENT", "0") not in ("", "0")
+SLOW_QUERY_MS = float(os.environ.get("RMS_DB_SLOW_MS", "50"))
+INSTRUMENT_FILE = os.environ.get("RMS_DB_INSTRUMENT_FILE", "db_instrumentation.json")
+
+class DuplicateRecordError(sqlite3.IntegrityError):
+    # Raised when an insert/update collides with an existing name or email
+    pass
+
+class ConflictError(sqlite3.DatabaseError):
+    # Raised when update_record/delete_record is given an expected_version and
+    # the row has been changed since; current is the row as it is now
+    def __init__(self, message, current=None):
+        super().__init__(message)
+        self.current = current
+
+def instrumented(method):
+    # Latency histogram per public method when instrumentation is on; includes
+    # cache hits and lock retries, i.e. what the caller actually waited
+    name = f"Database.{method.__name__}"
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.instrumentation is None:
+            return method(self, *args, **kwargs)
+        return self.instrumentation.timed(name, method, self, *args, **kwargs)
+    return wrapper
+
+def projected_columns(columns):
+    # None for whole records, else the requested columns with id first
+    if columns is None:
+        return None
+    unknown = [c for c in columns if c not in RECORD_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    return ("id",) + tuple(c for c in columns if c != "id")
+
+class Storage:
+    # What the apps, manage_db.py and the tests use, whatever holds the rows:
+    # Database (SQLite file), MemoryStorage (dicts, nothing on disk) and
+    # WriteBehindStorage (memory in front of a Database). Engines implement
+    # the record methods; listeners, spans and CSV handling live here.
+    _shared = {}
+    _shared_lock = threading.Lock()
+    has_fts = True
+    cache = None
+
+    def __init__(self, db_name, instrument=None):
+        self.db_name = db_name
+        self._listeners = []
+        if instrument is None:
+            instrument = DEFAULT_INSTRUMENT
+        self.instrumentation = Instrumentation(SLOW_QUERY_MS, INSTRUMENT_FILE or None) if instrument else None
+
+    def create_table(self):
+        # The apps' startup job; engines with a schema upgrade it in migrate().
+        # Only the schema steps run here, so the first page isn't held up by
+        # an upgrade's chunked backfills; those finish in the background.
+        self.migrate(backfill=False)
+        self.start_backfills()
+
+    def migrate(self, batch_size=None, progress=None, backfill=True):
+        return []
+
+    def start_backfills(self):
+        pass
+
+    def checkpoint(self, mode="PASSIVE"):
+        return None
+
+    def start_checkpointer(self):
+        pass
+
+    def close(self):
+        if self.instrumentation is not None and self.instrumentation.path:
+            self.instrumentation.dump(self.instrumentation.path)
+        with Storage._shared_lock:
+            if Storage._shared.get(self.db_name) is self:
+                del Storage._shared[self.db_name]
+
+    def subscribe(self, callback):
+        # callback(event, ids) runs after each committed write, where event is
+        # "inserted", "updated" or "deleted" and ids lists the affected records
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, event, ids):
+        if ids:
+            for callback in list(self._listeners):
+                callback(event, list(ids))
+
+    def span(self, name):
+        # Context manager timing a block (e.g. widget construction) alongside the DB timings
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.span(name)
+
+    def instrumentation_report(self):
+        if self.instrumentation is None:
+            return "Instrumentation is off (set RMS_DB_INSTRUMENT=1)"
+        return format_report(self.instrumentation.snapshot())
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else None
+
+    # Record methods every engine provides; see Database for the reference behaviour
+    def add_record(self, name, age, address, contact, email):
+        raise NotImplementedError
+
+    def add_records(self, rows, batch_size=500):
+        raise NotImplementedError
+
+    def get_records(self, columns=None):
+        raise NotImplementedError
+
+    def get_record_by_id(self, record_id):
+        raise NotImplementedError
+
+    def get_records_by_ids(self, ids):
+        raise NotImplementedError
+
+    def get_records_page(self, after_id=None, limit=50, order_by="id", columns=None, filters=None):
+        raise NotImplementedError
+
+    def id_at_offset(self, offset, order_by="id"):
+        raise NotImplementedError
+
+    def iter_records(self, batch_size=500, columns=None):
+        raise NotImplementedError
+
+    def count_records(self, filters=None):
+        raise NotImplementedError
+
+    def search(self, query, limit=50):
+        raise NotImplementedError
+
+    def stats(self, top_domains=10):
+        raise NotImplementedError
+
+    def verify_not_exists(self, name, email, exclude_id=None):
+        raise NotImplementedError
+
+    def update_record(self, record_id, name, age, address, contact, email, expected_version=None):
+        raise NotImplementedError
+
+    def update_records(self, changes):
+        raise NotImplementedError
+
+    def delete_record(self, record_id, expected_version=None):
+        raise NotImplementedError
+
+    def delete_records(self, ids):
+        raise NotImplementedError
+
+    @instrumented
+    def import_csv(self, path, batch_size=500):
+        # Expects a header row naming the columns; an "id" column is ignored
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            missing = [field for field in FIELDS if field not in (reader.fieldnames or [])]
+            if missing:
+                raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+            inserted, rejects = self.add_records(reader, batch_size=batch_size)
+        # Report CSV line numbers (header is line 1)
+        return inserted, [(number + 1, row, reason) for number, row, reason in rejects]
+
+    @instrumented
+    def export_csv(self, path):
+        count = 0
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for record in self.iter_records(batch_size=1000):
+                writer.writerow(record.as_tuple())
+                count += 1
+        return count
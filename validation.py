@@ -0,0 +1,107 @@
+import re
+from itertools import compress, repeat
+from operator import not_
+
+FIELDS = ("name", "age", "address", "contact", "email")
+LABELS = {"name": "Name", "age": "Age", "address": "Address", "contact": "Contact", "email": "Email"}
+
+# Compiled once at import; used with fullmatch so no anchors are needed
+CONTACT_LENGTH = 11
+MAX_AGE = 150
+AGE_RE = re.compile(r"0*[1-9][0-9]*")
+# Whole numbers above MAX_AGE; also keeps ages within SQLite's 64-bit INTEGER
+OVER_MAX_AGE_RE = re.compile(r"0*(?:15[1-9]|1[6-9][0-9]|[2-9][0-9]{2}|[1-9][0-9]{3,})")
+CONTACT_RE = re.compile(r"[0-9]{%d}" % CONTACT_LENGTH)
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+
+
+def validate_record(name, age, address, contact, email):
+    # Single form; returns (clean_row, errors) like one row of validate_rows
+    clean, errors = validate_rows([(name, age, address, contact, email)])
+    return clean[0], errors[0]
+
+
+def validate_rows(rows):
+    # Validates many rows column by column. rows are (name, age, address,
+    # contact, email) sequences or dicts keyed by FIELDS. Returns (clean, errors):
+    # clean[i] is the stripped row with an int age, or None when errors[i]
+    # (the list of messages for row i) is non-empty.
+    rows = list(rows)
+    if any(map(isinstance, rows, repeat(dict))):
+        rows = [[row.get(field) for field in FIELDS] if isinstance(row, dict) else row for row in rows]
+    errors = [[] for _ in rows]
+    misshapen = [] if set(map(len, rows)) <= {len(FIELDS)} else \
+        [i for i, row in enumerate(rows) if len(row) != len(FIELDS)]
+    if misshapen:
+        blank = ("",) * len(FIELDS)
+        for i in misshapen:
+            errors[i].append(f"Expected {len(FIELDS)} fields, got {len(rows[i])}")
+            rows[i] = blank
+    if not rows:
+        return [], []
+
+    columns = [_strip_column(column) for column in zip(*rows)]
+    names, ages, addresses, contacts, emails = columns
+
+    for field, column in zip(FIELDS, columns):
+        _check_column(field, column, errors)
+    for i in misshapen:
+        del errors[i][1:]
+    if not any(errors):
+        return list(zip(names, map(int, ages), addresses, contacts, emails)), errors
+    clean = [None if row_errors else (name, int(age), address, contact, email)
+             for row_errors, name, age, address, contact, email in zip(errors, *columns)]
+    return clean, errors
+
+
+def validate_changes(fields):
+    # Partial update, e.g. {"age": "21"}; only the given fields are checked.
+    # Returns (clean, errors) with clean mapping field -> value (age as int).
+    errors = [[]]
+    clean = {}
+    for field, value in fields.items():
+        if field not in LABELS:
+            raise ValueError(f"Unknown field: {field}")
+        column = _strip_column([value])
+        _check_column(field, column, errors)
+        clean[field] = column[0]
+    if errors[0]:
+        return None, errors[0]
+    if "age" in clean:
+        clean["age"] = int(clean["age"])
+    return clean, []
+
+
+def _check_column(field, column, errors):
+    # Each check only yields the failing indices, so passing rows never reach Python code
+    message = f"{LABELS[field]} is required"
+    for i in compress(range(len(column)), map(not_, column)):
+        errors[i].append(message)
+    if field == "age":
+        for i in _failing(column, AGE_RE):
+            errors[i].append("Age must be a positive number")
+        for i in compress(range(len(column)), map(OVER_MAX_AGE_RE.fullmatch, column)):
+            errors[i].append(f"Age must be at most {MAX_AGE}")
+    elif field == "contact":
+        for i in _failing(column, CONTACT_RE):
+            if column[i].isascii() and column[i].isdigit():
+                errors[i].append(f"Contact number must be exactly {CONTACT_LENGTH} digits")
+            else:
+                errors[i].append("Contact must contain only numbers (no letters)")
+    elif field == "email":
+        for i in _failing(column, EMAIL_RE):
+            errors[i].append("Invalid Email format (e.g. user@example.com)")
+
+
+def _strip_column(column):
+    try:
+        return list(map(str.strip, column))
+    except TypeError:
+        # Not all strings (e.g. int ages, None for missing CSV cells)
+        return ["" if value is None else str(value).strip() for value in column]
+
+
+def _failing(column, pattern):
+    # Indices of non-blank values the pattern does not fully match
+    rejected = compress(range(len(column)), map(not_, map(pattern.fullmatch, column)))
+    return [i for i in rejected if column[i]]